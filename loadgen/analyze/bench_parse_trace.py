@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# Measures the throughput of parse_trace.parse_ftrace on a synthetic trace-cmd report:
+# background sched_switch/sched_wakeup traffic of unrelated tasks around the lifecycle
+# (fork, wakeup, switch, migrate, exit) of the workload pids.
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from colorama import Fore, Style
+from parse_trace import parse_ftrace
+
+
+def write_trace(path, lines, tasks, cpus=16, seed=0):
+	rng = random.Random(seed)
+	pids = list(range(20000, 20000 + tasks))
+	# Background pids share digits with the workload pids, so substring matches would be wrong
+	background = [int(str(pid)[:-1]) for pid in pids[::10]] + list(range(200000, 200200))
+	per_task = lines // tasks
+	timestamp = 5000.0
+
+	with open(path, "w") as f:
+		f.write(f"cpus={cpus}\n")
+		for pid in pids:
+			cpu = rng.randrange(cpus)
+			events = [
+				("bash", 1900, f"sched_process_fork: comm=bash pid=1900 child_comm=bash child_pid={pid}"),
+				("bash", 1900, f"sched_wakeup_new: comm=bash pid={pid} prio=120 target_cpu={cpu:03d}"),
+				("<idle>", 0, f"sched_switch: prev_comm=swapper/{cpu} prev_pid=0 prev_prio=120 prev_state=R ==> next_comm=bash next_pid={pid} next_prio=120"),
+				("bash", pid, f"sched_migrate_task: comm=bash pid={pid} prio=120 orig_cpu={cpu} dest_cpu={(cpu + 1) % cpus}"),
+				("fib", pid, f"sched_process_exec: filename=/usr/bin/fib pid={pid} old_pid={pid}"),
+			]
+			for _ in range(per_task - 6):
+				other = rng.choice(background)
+				events.append(("kworker/u32:1", other,
+							   f"sched_switch: prev_comm=kworker/u32:1 prev_pid={other} prev_prio=120 prev_state=S ==> next_comm=sshd next_pid={other + 1} next_prio=120"))
+			events.append(("fib", pid, f"sched_process_exit: comm=fib pid={pid} prio=120 group_dead=1"))
+
+			for comm, task, details in events:
+				timestamp += rng.random() * 1e-4
+				f.write(f"{comm:>16}-{task:<7} [{cpu:03d}] {timestamp:.6f}: {details}\n")
+
+	return set(pids)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark parse_trace.parse_ftrace on a synthetic trace")
+	parser.add_argument("--lines", type=int, default=2_000_000, help="Approximate number of trace lines")
+	parser.add_argument("--tasks", type=int, default=5000, help="Number of workload pids in the trace")
+	parser.add_argument("--trace", help="Benchmark an existing trace-cmd report instead, with --pids")
+	parser.add_argument("--pids", help="_pids.txt of the run that produced --trace")
+	args = parser.parse_args()
+
+	if args.trace:
+		with open(args.pids, "r") as f:
+			pids = {int(line.split()[0]) for line in f if line.strip()}
+		trace_path = args.trace
+	else:
+		trace_path = os.path.join(tempfile.mkdtemp(), "trace.txt")
+		print(f"{Fore.GREEN}{Style.BRIGHT}Writing a synthetic trace of ~{args.lines} lines to {trace_path}{Style.RESET_ALL}")
+		pids = write_trace(trace_path, args.lines, args.tasks)
+
+	with open(trace_path, "rb") as f:
+		lines = sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 24), b""))
+
+	start = time.perf_counter()
+	events = parse_ftrace(trace_path, set(pids))
+	elapsed = time.perf_counter() - start
+
+	print(f"{Fore.CYAN}{Style.BRIGHT}{lines} lines, {sum(len(e) for e in events.values())} workload events of "
+		  f"{len(events)} pids in {elapsed:.2f} s: {lines / elapsed / 1e6:.2f}M lines/s{Style.RESET_ALL}")
+
+	if not args.trace:
+		os.remove(trace_path)
+		os.rmdir(os.path.dirname(trace_path))
+
+
+if __name__ == "__main__":
+	main()
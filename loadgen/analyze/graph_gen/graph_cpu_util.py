@@ -8,6 +8,14 @@ import os
 
 from colorama import Fore, Style
 
+__file = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file)))
+from utils.cpu_monitoring import read_cpu_util_bin
+
+# Rows per block when streaming a log, columns of the downsampled heatmap
+CHUNK_ROWS = 1 << 16
+HEATMAP_BINS = 2000
+
 
 def printc(*args, color=Fore.CYAN, **kwargs):
 	print(f"{color}{' '.join(map(str, args))}{Style.RESET_ALL}", **kwargs)
@@ -18,29 +26,128 @@ def printr(*args, color=Fore.RED, **kwargs):
 
 
 def load_data(file_path):
+	"""
+	Returns ((times, matrix, cpu_numbers, start), name): times in seconds since the first sample,
+	matrix rows are samples and columns CPUs. A .bin log is memory mapped, not read.
+	"""
+	name = os.path.basename(file_path)
 	try:
-		data = pd.read_csv(file_path)
-		return data, os.path.basename(file_path)
+		if file_path.endswith(".bin"):
+			header, data = read_cpu_util_bin(file_path)
+			return (data[:, 0], data[:, 1:], header['cpu_ids'], header['start_time']), name
+
+		df = pd.read_csv(file_path)
+		cpu_cols = [col for col in df.columns if col.startswith('cpu_')]
+		start = df['timestamp'].iloc[0]
+		return ((df['timestamp'] - start).to_numpy(), df[cpu_cols].to_numpy(),
+				[int(col.replace('cpu_', '')) for col in cpu_cols], start), name
 	except Exception as e:
 		print(f"Error loading {file_path}: {e}")
-		return None, os.path.basename(file_path)
-
-
-def process_cpu_util_data(df):
-	# Convert timestamp to relative time (starting from 0)
-	df['timestamp'] = df['timestamp'] - df['timestamp'].iloc[0]
+		return None, name
+
+
+def load_sched_data(file_path):
+	# _cpu_sched.csv written next to _cpu_util.csv/.bin by the same sampler, None for older runs
+	base, _ = os.path.splitext(file_path)
+	sched_path = base.replace("_cpu_util", "_cpu_sched") + ".csv"
+	if sched_path == file_path or not os.path.exists(sched_path):
+		return None
+	return pd.read_csv(sched_path)
+
+
+def process_sched_data(sched_df, start):
+	sched_df['timestamp'] = sched_df['timestamp'] - start
+
+	# Tasks waiting on the runqueues of the workload CPUs, like the utilization CPU 0 is left out
+	wait_cols = [col for col in sched_df.columns if col.startswith('wait_') and col != 'wait_0']
+	sched_df['queued'] = sched_df[wait_cols].sum(axis=1, min_count=1)
+	return sched_df
+
+
+def process_cpu_util_data(times, matrix, cpu_numbers):
+	"""
+	One pass over the log in CHUNK_ROWS blocks, so a memory mapped log is never loaded whole.
+	Returns the (timestamp, avg_cpu_util) timeline, a heatmap block-averaged to at most
+	HEATMAP_BINS columns and the summary statistics, accumulated per block.
+	"""
+	# CPU 0 runs the orchestrator, it is left out of the averages
+	cols = [i for i, cpu in enumerate(cpu_numbers) if cpu != 0]
+	rows = len(matrix)
+	bins = min(HEATMAP_BINS, rows)
+
+	avg = np.empty(rows)
+	heat_sum = np.zeros((bins, len(cols)))
+	heat_count = np.zeros(bins)
+	total = total_sq = above_95 = below_50 = 0.0
+
+	for first in range(0, rows, CHUNK_ROWS):
+		chunk = np.asarray(matrix[first:first + CHUNK_ROWS], dtype=np.float64)[:, cols]
+		chunk_avg = chunk.mean(axis=1)
+		avg[first:first + len(chunk)] = chunk_avg
+		total += chunk_avg.sum()
+		total_sq += (chunk_avg ** 2).sum()
+		above_95 += (chunk_avg > 95).sum()
+		below_50 += (chunk_avg < 50).sum()
+
+		# Rows are in time order, so each block covers a run of consecutive heatmap columns
+		row_bins = np.arange(first, first + len(chunk)) * bins // rows
+		starts = np.flatnonzero(np.r_[True, np.diff(row_bins) > 0])
+		heat_sum[row_bins[starts]] += np.add.reduceat(chunk, starts, axis=0)
+		heat_count[row_bins[starts]] += np.diff(np.r_[starts, len(chunk)])
+
+	mean = total / rows
+	util = {
+		'heatmap': (heat_sum / heat_count[:, None]).T,
+		'heat_times': np.asarray(times[np.arange(bins) * rows // bins]),
+		'cpu_numbers': [cpu_numbers[i] for i in cols],
+		'mean': mean,
+		'std': np.sqrt(max(total_sq / rows - mean ** 2, 0.0) * rows / max(rows - 1, 1)),
+		'above_95': above_95 / rows * 100,
+		'below_50': below_50 / rows * 100,
+	}
+	df = pd.DataFrame({'timestamp': np.asarray(times, dtype=np.float64), 'avg_cpu_util': avg})
+	return df, util
+
+
+def analyze_sched_pressure(*datasets):
+	# Utilization next to queueing: tasks waiting on the runqueues (schedstat), runnable tasks and PSI
+	fig, axes = plt.subplots(3, 1, figsize=(15, 12), dpi=300, sharex=True)
+	for (df, sched_df, label) in datasets:
+		axes[0].plot(df['timestamp'], df['avg_cpu_util'], label=label, linewidth=1.5)
+		if sched_df['queued'].notna().any():
+			axes[1].plot(sched_df['timestamp'], sched_df['queued'], label=f"{label} waiting (schedstat)", linewidth=1.5)
+		axes[1].plot(sched_df['timestamp'], sched_df['procs_running'], label=f"{label} procs_running",
+					 linewidth=1, linestyle='--')
+		axes[2].plot(sched_df['timestamp'], sched_df['psi_some'], label=f"{label} some", linewidth=1.5)
+		axes[2].plot(sched_df['timestamp'], sched_df['psi_full'], label=f"{label} full", linewidth=1, linestyle='--')
+
+	axes[0].set_ylabel('CPU Utilization (%)')
+	axes[0].set_ylim(0, 100)
+	axes[1].set_ylabel('Tasks')
+	axes[2].set_ylabel('CPU pressure (% of time stalled)')
+	axes[2].set_xlabel('Time (s)')
+	axes[0].set_title('CPU Utilization and Queueing Pressure Over Time')
+	for ax in axes:
+		ax.legend()
+		ax.grid(True, alpha=0.3)
 
-	# Calculate overall CPU utilization metrics
-	cpu_cols = [col for col in df.columns if (col.startswith('cpu_') and col != 'cpu_0')]
-	df['avg_cpu_util'] = df[cpu_cols].mean(axis=1)
+	plt.tight_layout()
+	plt.savefig("figures/timeseries_cpu_pressure.png")
+	plt.close()
+	printr("Saved queueing pressure plot as timeseries_cpu_pressure.png")
 
-	return df, cpu_cols
+	for (df, sched_df, label) in datasets:
+		print(f"\n{label}:")
+		if sched_df['queued'].notna().any():
+			print(f"  Tasks waiting on the runqueues: mean {sched_df['queued'].mean():.2f}, max {sched_df['queued'].max():.2f}")
+		print(f"  procs_running: mean {sched_df['procs_running'].mean():.2f}, max {sched_df['procs_running'].max():.0f}")
+		print(f"  CPU pressure (some): mean {sched_df['psi_some'].mean():.2f}%")
 
 
 def analyze_cpu_util_data(*datasets):
 	# Time series plots of overall CPU utilization
 	plt.figure(figsize=(15, 10), dpi=300)
-	for (df, cpu_cols, label) in datasets:
+	for (df, util, label) in datasets:
 		plt.plot(df['timestamp'], df['avg_cpu_util'], label=label, linewidth=1.5)
 
 	plt.title('CPU Utilization Over Time')
@@ -70,8 +177,8 @@ def analyze_cpu_util_data(*datasets):
 		if num_datasets == 1:
 			axes = [axes]
 
-		for i, (df, cpu_cols, label) in enumerate(datasets):
-			heatmap_data = df[cpu_cols].T
+		for i, (df, util, label) in enumerate(datasets):
+			heatmap_data = util['heatmap']
 
 			im = axes[i].imshow(heatmap_data, aspect='auto', cmap='RdYlBu_r', vmin=0, vmax=100)
 			cbar = plt.colorbar(im, ax=axes[i], label='CPU Utilization (%)')
@@ -80,14 +187,15 @@ def analyze_cpu_util_data(*datasets):
 			axes[i].set_ylabel('CPU Core')
 
 			# Set x-axis to show actual timestamps
-			num_ticks = min(10, len(df))  # Show up to 10 time labels
-			tick_indices = np.linspace(0, len(df)-1, num_ticks, dtype=int)
-			tick_labels = [f"{df['timestamp'].iloc[idx]:.1f}" for idx in tick_indices]
+			heat_times = util['heat_times']
+			num_ticks = min(10, len(heat_times))  # Show up to 10 time labels
+			tick_indices = np.linspace(0, len(heat_times)-1, num_ticks, dtype=int)
+			tick_labels = [f"{heat_times[idx]:.1f}" for idx in tick_indices]
 			axes[i].set_xticks(tick_indices)
 			axes[i].set_xticklabels(tick_labels, rotation=45)
 
 			# Set y-axis labels to show CPU numbers
-			cpu_numbers = [col.replace('cpu_', '') for col in cpu_cols]
+			cpu_numbers = [str(cpu) for cpu in util['cpu_numbers']]
 			axes[i].set_yticks(range(len(cpu_numbers)))
 			axes[i].set_yticklabels(cpu_numbers)
 
@@ -101,26 +209,31 @@ def analyze_cpu_util_data(*datasets):
 	printc("CPU Utilization Summary Statistics", color=Fore.GREEN)
 	print("="*50)
 
-	for (df, cpu_cols, label) in datasets:
+	for (df, util, label) in datasets:
 		print(f"\n{label}:")
-		print(f"  Average CPU Utilization: {df['avg_cpu_util'].mean():.2f}% ± {df['avg_cpu_util'].std():.2f}%")
-		print(f"  Time at >95% utilization: {(df['avg_cpu_util'] > 95).sum() / len(df) * 100:.2f}%")
-		print(f"  Time at <50% utilization: {(df['avg_cpu_util'] < 50).sum() / len(df) * 100:.2f}%")
+		print(f"  Average CPU Utilization: {util['mean']:.2f}% ± {util['std']:.2f}%")
+		print(f"  Time at >95% utilization: {util['above_95']:.2f}%")
+		print(f"  Time at <50% utilization: {util['below_50']:.2f}%")
 
 
 def main():
 	parser = argparse.ArgumentParser(
-		description='Process CSV CPU utilization data files and generate utilization plots.')
-	parser.add_argument('files', nargs='+', help='Paths to CSV files to process')
+		description='Process CPU utilization logs (_cpu_util.csv or .bin) and generate utilization plots.')
+	parser.add_argument('files', nargs='+', help='Paths to _cpu_util.csv or _cpu_util.bin files to process')
 	args = parser.parse_args()
 	pd.set_option('display.float_format', '{:.2f}'.format)
 
 	datasets = []
+	sched_datasets = []
 	for file_path in args.files:
-		df, name = load_data(file_path)
-		if df is not None:
-			df, cpu_cols = process_cpu_util_data(df)
-			datasets.append((df, cpu_cols, name))
+		data, name = load_data(file_path)
+		if data is not None:
+			times, matrix, cpu_numbers, start = data
+			df, util = process_cpu_util_data(times, matrix, cpu_numbers)
+			datasets.append((df, util, name))
+			sched_df = load_sched_data(file_path)
+			if sched_df is not None:
+				sched_datasets.append((df, process_sched_data(sched_df, start), name))
 		else:
 			printr(f"Failed to load {file_path}")
 
@@ -130,6 +243,8 @@ def main():
 
 	# Analyze the data
 	analyze_cpu_util_data(*datasets)
+	if sched_datasets:
+		analyze_sched_pressure(*sched_datasets)
 
 
 if __name__ == "__main__":
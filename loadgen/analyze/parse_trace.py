@@ -2,6 +2,7 @@
 import sys
 import re
 import os
+import mmap
 import pandas as pd
 
 from colorama import Fore, Style
@@ -13,6 +14,16 @@ from tqdm import tqdm  # Add this import
 # Get current working directory
 cwd = os.path.dirname(os.path.realpath(__file__))
 
+# Regex pattern for parsing ftrace lines
+# Format: process-pid [cpu]timestamp: event_type: details
+# e.g trace-cmd-3548  [000]  4896.102217: task_rename:          pid=3548 oldcomm=trace-cmd newcomm=exec_workload.p oom_score_adj=0
+# Version 3.3.1 of trace-cmd has extra task state flags so the regex should catch both versions
+# Like so: trace-cmd-3548  [000]-0x1  4896.102217: task_rename:          pid=3548 oldcomm=trace-cmd newcomm=exec_workload.p oom_score_adj=0
+trace_pattern = re.compile(
+	r'(.+?)-(\d+)\s+\[(\d+)\](?:.*?)?\s+(\d+\.\d+):\s+(\S+):\s+(.*)')
+
+CHUNK_SIZE = 1 << 24
+
 
 @dataclass
 class TraceEvent:
@@ -26,14 +37,6 @@ class TraceEvent:
 
 
 def parse_event_from_line(line):
-	# Regex pattern for parsing ftrace lines
-	# Format: process-pid [cpu]timestamp: event_type: details
-	# e.g trace-cmd-3548  [000]  4896.102217: task_rename:          pid=3548 oldcomm=trace-cmd newcomm=exec_workload.p oom_score_adj=0
-	# Version 3.3.1 of trace-cmd has extra task state flags so the regex should catch both versions
-	# Like so: trace-cmd-3548  [000]-0x1  4896.102217: task_rename:          pid=3548 oldcomm=trace-cmd newcomm=exec_workload.p oom_score_adj=0
-	trace_pattern = re.compile(
-		r'(.+?)-(\d+)\s+\[(\d+)\](?:.*?)?\s+(\d+\.\d+):\s+(\S+):\s+(.*)')
-
 	match = trace_pattern.match(line)
 	if match:
 		process, pid, cpu, timestamp, event_type, details_str = match.groups()
@@ -56,45 +59,92 @@ def parse_event_from_line(line):
 		exit(-1)
 
 
+def pid_alternation(pids):
+	# Digit trie of the pids as a regex alternation, so the engine tests a token against all pids in one step
+	trie = {}
+	for pid in pids:
+		node = trie
+		for digit in str(pid):
+			node = node.setdefault(digit, {})
+		node[''] = {}
+
+	def expression(node):
+		branches = [digit + expression(child) for digit, child in sorted(node.items()) if digit]
+		if not branches:
+			return ''
+		group = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+		return f"(?:{group})?" if '' in node else group
+
+	return expression(trie)
+
+
+def pid_matchers(pids):
+	"""
+	Bytes patterns for the two places a pid appears in a trace line: the task in the header
+	("comm-1234  [003]") and the pid-valued fields of the event (pid=, next_pid=, prev_pid=,
+	child_pid=, ...). Both only match whole tokens of the workload pids, and both start with a
+	literal the regex engine searches for, which a single alternation of the two would not.
+	"""
+	alternation = pid_alternation(pids).encode()
+	return (re.compile(rb'-(' + alternation + rb') +\['),
+			re.compile(rb'pid=(' + alternation + rb')(?!\d)'))
+
+
 def parse_ftrace(file_path, pids: set):
+	"""
+	Single pass over the memory mapped trace in CHUNK_SIZE windows: the pid_matchers find the lines of the
+	workload pids inside each window, only those lines are decoded and parsed into TraceEvents,
+	once each. A pid is matched as a whole token, so 123 does not match pid=1234 or a timestamp.
+	A pid stops matching at its sched_process_exit, in case the pid is reused.
+	"""
 	print(f"{Fore.GREEN}{Style.BRIGHT}Parsing ftrace file: {file_path}{Style.RESET_ALL}")
 
 	workload_events_dict = defaultdict(list)
-	pids_str = set({str(pid) for pid in pids} ) # Convert all PIDs to strings once and make it a set for faster lookups
+	live = {str(pid).encode() for pid in pids}
+	matchers = pid_matchers(pids)
 
 	try:
 		file_size = os.path.getsize(file_path)
 
-		with open(file_path, 'r') as f:
+		with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as trace:
 			# Remove the first comment or #ncpus line
-			_ = f.readline()
+			position = trace.find(b"\n") + 1
 
 			# Create progress bar
 			with tqdm(total=file_size, unit='B', unit_scale=True,
 					  desc="Parsing trace", bar_format='{l_bar}{bar:30}{r_bar}') as pbar:
-
-				for raw_line in f:
-					pbar.update(len(raw_line))
-					line = raw_line.strip()
-					pids_to_remove = set()
-
-					for pid_str in pids_str:
-						if pid_str in line:
-							event = parse_event_from_line(line)
-							# Border case where the pid is part of the digits in timestamp
-							if pid_str not in str(event.pid) and pid_str not in str(event.details):
-								continue
-							else:
-								workload_events_dict[int(
-									pid_str)].append(event)
+				pbar.update(position)
+
+				while position < file_size:
+					# Window of whole lines, scanned in place
+					end = min(position + CHUNK_SIZE, file_size)
+					if end < file_size:
+						end = trace.find(b"\n", end) + 1 or file_size
+
+					# Line start -> workload pids on the line
+					lines = defaultdict(list)
+					for matcher in matchers:
+						for match in matcher.finditer(trace, position, end):
+							line_pids = lines[trace.rfind(b"\n", position, match.start()) + 1 or position]
+							if match.group(1) not in line_pids:
+								line_pids.append(match.group(1))
+
+					for start in sorted(lines):
+						line_pids = [pid for pid in lines[start] if pid in live]
+						if not line_pids:
+							continue
+
+						line_end = trace.find(b"\n", start, end)
+						event = parse_event_from_line(trace[start:line_end if line_end != -1 else end].strip().decode())
+						for pid_bytes in line_pids:
+							workload_events_dict[int(pid_bytes)].append(event)
 
 							# Check if the event is sched_process_exit, if so remove the pid from the set
-							if event.event_type == "sched_process_exit" and f"pid={pid_str} " in event.details:
-								pids_to_remove.add(pid_str)
-								break
+							if event.event_type == "sched_process_exit" and f"pid={pid_bytes.decode()} " in event.details:
+								live.discard(pid_bytes)
 
-					#Remove them not not to fuck up array iteration in python (known bug)
-					pids_str -=  pids_to_remove
+					pbar.update(end - position)
+					position = end
 
 	except Exception as e:
 		print(f"{Fore.RED}	Error parsing trace file: {e}{Style.RESET_ALL}")
@@ -146,6 +196,7 @@ def pids_ftoset(pid_file):
 def get_workload_times(workload_events, pids_wargs):
 	print(f"{Fore.GREEN}{Style.BRIGHT}Getting workload times{Style.RESET_ALL}")
 	workload_times = {}
+	arg_of = {pid: arg for arg, pid in pids_wargs}
 
 	for pid, events in workload_events.items():
 		try:
@@ -187,8 +238,7 @@ def get_workload_times(workload_events, pids_wargs):
 				exit(-1)
 
 			#Find the arguments of the workload
-			arg = next(
-				(arg for arg, pid_arg in pids_wargs if pid_arg == pid), None)
+			arg = arg_of.get(pid)
 			if arg is None:
 				print(
 					f"{Fore.RED}{Style.BRIGHT}Error: PID {pid} not found in the workload arguments{Style.RESET_ALL}")
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+# Compare the achievable arrival rate and dispatch jitter of the threaded and asyncio backends
+import os
+import sys
+import argparse
+import subprocess
+import tempfile
+import numpy as np
+import pandas as pd
+from utils.columnar import read_timings
+from colorama import Fore, Style
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+exec_workload_cmd = [sys.executable, os.path.join(script_dir, "exec_workload.py")]
+BACKENDS = ("threaded", "asyncio")
+
+
+def write_constant_rate_workload(path, rate, tasks, arg):
+	with open(path, "w") as f:
+		f.write(f"0.0 {arg}\n")
+		for _ in range(tasks - 1):
+			f.write(f"{1 / rate} {arg}\n")
+
+
+def run_backend(backend, workload_path, outputfile, args):
+	cmd = exec_workload_cmd + [
+		"--outputfile", outputfile,
+		"--workload_file", workload_path,
+		"--backend", backend,
+		"--spawn", args.spawn,
+		"--spin_window", str(args.spin_window),
+	]
+	if backend == "threaded":
+		cmd += ["--dispatcher", args.dispatcher]
+
+	subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+	return read_timings(outputfile)
+
+
+def summarize(df, tasks):
+	fired = np.sort((df['request_time'] + df['lateness']).to_numpy())
+	lateness = df['lateness'].to_numpy() * 1e6
+
+	return {
+		"completed": f"{len(df)}/{tasks}",
+		"rate": (len(fired) - 1) / (fired[-1] - fired[0]) if len(fired) > 1 else 0.0,
+		"p50_us": np.percentile(lateness, 50),
+		"p99_us": np.percentile(lateness, 99),
+		"max_us": lateness.max(),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark dispatch precision of the exec_workload backends")
+	parser.add_argument("--rates", type=str, default="100,250,500,1000,2000", help="Comma separated arrival rates (tasks/s)")
+	parser.add_argument("--tasks", type=int, default=1000, help="Tasks per run")
+	parser.add_argument("--arg", type=str, default="1", help="Payload argument (keep it small)")
+	parser.add_argument("--spawn", type=str, default="chain", help="Spawn mode passed to exec_workload")
+	parser.add_argument("--dispatcher", type=str, default="deadline", help="Dispatcher of the threaded backend")
+	parser.add_argument("--spin_window", type=float, default=0.0002, help="Spin window passed to exec_workload")
+	args = parser.parse_args()
+
+	rows = []
+	with tempfile.TemporaryDirectory() as tmp:
+		for rate in (float(r) for r in args.rates.split(",")):
+			workload_path = os.path.join(tmp, f"workload_{rate:g}.txt")
+			write_constant_rate_workload(workload_path, rate, args.tasks, args.arg)
+
+			for backend in BACKENDS:
+				print(f"{Fore.GREEN}Running {backend} backend at {rate:g} tasks/s{Style.RESET_ALL}")
+				df = run_backend(backend, workload_path, os.path.join(tmp, f"{backend}_{rate:g}"), args)
+				rows.append({"backend": backend, "target_rate": rate, **summarize(df, args.tasks)})
+
+	print(f"\n{Fore.CYAN}Achieved arrival rate and dispatch lateness{Style.RESET_ALL}")
+	print(pd.DataFrame(rows).to_string(index=False, float_format="{:.1f}".format))
+
+
+if __name__ == "__main__":
+	main()
@@ -1,49 +1,142 @@
 #!/usr/bin/python3
-import time
-from datetime import date
-import subprocess
+# Measure the CPU time of the fib payload per argument and write this host's calibration profile
 import os
+import time
+import queue
 import socket
+import argparse
+import threading
+import statistics
+from datetime import datetime
+from utils.spawn import payload_path
+from utils.calibration import save_profile
+from colorama import Fore, Style
 
-# The function to launch the C++ fibonacci function
-def launch_command_cpp(arg):
-    command = (
-        f"./payload/launch_function.out {arg}"
-    )
-    print(command)
-    subprocess.run(command, shell=True)
+# Two-sided 95% Student t quantiles for 1..30 degrees of freedom, the normal one beyond
+T975 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+		2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
 
 
-dur_list = []
-fib = []
+def confidence_interval(samples):
+	# Half width of the 95% confidence interval of the mean
+	n = len(samples)
+	t = T975[n - 2] if n - 1 <= len(T975) else 1.96
+	return t * statistics.stdev(samples) / n ** 0.5
 
 
-# Measure the runtime of the C++ fibonacci function
-def loop(arg, repeat):
-    start = time.time()
-    for i in range(repeat):
-        launch_command_cpp(arg)
-    end = time.time()
-    # get milliseconds
-    print("Runtime for arg {} is {} ms".format(arg, (end - start) * 1000 / repeat))
-    dur_list.append(round((end - start) * 1000 / repeat))
-    fib.append(arg)
-    with open(f"./log/calibrate_{socket.gethostname()}_{date.today()}.txt", "a") as f:
-        f.write(
-            "Runtime for arg {} is {} ms\n".format(arg, (end - start) * 1000 / repeat)
-        )
+def run_once(arg):
+	"""
+	Spawn the payload directly (no shell) and return (cpu_ms, wall_ms). The caller runs pinned to its
+	CPU, which the payload inherits before its exec. The CPU time comes from the child's rusage,
+	so fork/exec in the parent and time spent preempted are not counted.
+	"""
+	start = time.perf_counter()
+	pid = os.posix_spawn(payload_path, [payload_path, str(arg)], os.environ,
+						 file_actions=[(os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0)])
+	_, status, rusage = os.wait4(pid, 0)
+	wall = time.perf_counter() - start
 
+	if os.waitstatus_to_exitcode(status) != 0:
+		raise RuntimeError(f"payload {arg} exited with {os.waitstatus_to_exitcode(status)}")
+	return (rusage.ru_utime + rusage.ru_stime) * 1000, wall * 1000
 
-if __name__ == "__main__":
-    if not os.path.exists("./log"):
-        os.makedirs("./log")
 
-    for i in range(3, 41):
-        loop(i, 100)
+def calibrate_arg(arg, cpu, min_runs, max_runs, precision, max_seconds):
+	# Repeat until the confidence interval is within `precision` of the mean, max_runs or max_seconds
+	cpu_ms, wall_ms = [], []
+	deadline = time.monotonic() + max_seconds
+
+	while len(cpu_ms) < max_runs:
+		c, w = run_once(arg)
+		cpu_ms.append(c)
+		wall_ms.append(w)
+
+		if len(cpu_ms) >= min_runs:
+			mean = statistics.fmean(cpu_ms)
+			if confidence_interval(cpu_ms) <= precision * mean or time.monotonic() > deadline:
+				break
+
+	mean = statistics.fmean(cpu_ms)
+	ci = confidence_interval(cpu_ms) if len(cpu_ms) > 1 else float("inf")
+	return {
+		"mean_ms": mean,
+		"ci_ms": ci,
+		"stdev_ms": statistics.stdev(cpu_ms) if len(cpu_ms) > 1 else 0.0,
+		"runs": len(cpu_ms),
+		"wall_ms": statistics.fmean(wall_ms),
+		"converged": ci <= precision * mean,
+		"cpu": cpu,
+	}
+
+
+def main(args_to_run, cores, min_runs, max_runs, precision, max_seconds):
+	# Longest arguments first so the per-core workers finish close together
+	todo = queue.Queue()
+	for arg in sorted(args_to_run, reverse=True):
+		todo.put(arg)
+
+	stats = {}
+	lock = threading.Lock()
+
+	def worker(cpu):
+		# Per thread affinity, the payloads spawned from this thread start on `cpu`
+		os.sched_setaffinity(0, {cpu})
+		while True:
+			try:
+				arg = todo.get_nowait()
+			except queue.Empty:
+				return
+			result = calibrate_arg(arg, cpu, min_runs, max_runs, precision, max_seconds)
+			with lock:
+				stats[arg] = result
+			color = Fore.CYAN if result["converged"] else Fore.YELLOW
+			print(f"{color}fib {arg:>2} on CPU {cpu}: {result['mean_ms']:10.2f} ms CPU "
+				  f"(+-{result['ci_ms']:.2f}, {result['runs']} runs, wall {result['wall_ms']:.2f} ms){Style.RESET_ALL}")
+
+	print(f"{Fore.GREEN}Calibrating {len(args_to_run)} arguments on CPUs {sorted(cores)}{Style.RESET_ALL}")
+	threads = [threading.Thread(target=worker, args=(cpu,)) for cpu in sorted(cores)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+
+	fib = sorted(stats)
+	path = save_profile({
+		"host": socket.gethostname(),
+		"created": datetime.now().isoformat(timespec="seconds"),
+		"payload": os.path.basename(payload_path),
+		"clock": "rusage utime+stime",
+		"precision": precision,
+		"fib": fib,
+		"dur_ms": [round(stats[arg]["mean_ms"], 1) for arg in fib],
+		"stats": {str(arg): stats[arg] for arg in fib},
+	})
+	print(f"{Fore.GREEN}Calibration profile saved in {path}{Style.RESET_ALL}")
+
+
+def parse_args_range(spec):
+	# "24-46" or "24,30,35"
+	if "-" in spec:
+		low, high = spec.split("-")
+		return list(range(int(low), int(high) + 1))
+	return [int(a) for a in spec.split(",")]
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Calibrate fib argument to CPU time (ms) on this host")
+	parser.add_argument("--args", type=str, default="24-46", help="Fib arguments, a range (24-46) or a list")
+	parser.add_argument("--cores", type=str, default=None,
+						help="Comma separated (isolated) CPUs, one argument runs per CPU at a time (default: CPU 1)")
+	parser.add_argument("--min_runs", type=int, default=5, help="Runs before the confidence interval is checked")
+	parser.add_argument("--max_runs", type=int, default=100, help="Upper bound of runs per argument")
+	parser.add_argument("--precision", type=float, default=0.01,
+						help="Stop once the 95%% confidence interval is within this fraction of the mean")
+	parser.add_argument("--max_seconds", type=float, default=120, help="Time budget per argument")
+	args = parser.parse_args()
 
-    for i in range(40, 47):
-        loop(i, 20)
+	if args.cores:
+		cores = {int(c) for c in args.cores.split(",")}
+	else:
+		cores = {1} if os.cpu_count() > 1 else {0}
 
-    with open(f"./log/calibrate_list_{socket.gethostname()}_{date.today()}.txt", "w") as f:
-        f.write("dur_list = {}\n".format(dur_list))
-        f.write("fib = {}\n".format(fib))
+	main(parse_args_range(args.args), cores, max(2, args.min_runs), args.max_runs, args.precision, args.max_seconds)
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+# Replay one workload with several exec_workload generator processes and merge their results
+import os
+import sys
+import time
+import argparse
+import shutil
+import subprocess
+import tempfile
+import pandas as pd
+import utils.exec_utils as exec_utils
+from utils.columnar import read_timings, timings_path
+from utils.cpu_monitoring import start_cpu_monitoring, stop_cpu_monitoring, CPU_LOG_FORMATS
+from colorama import Fore, Style
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+workload_file = os.path.join(script_dir, "dataset/workload_dur.txt")
+exec_workload_cmd = [sys.executable, os.path.join(script_dir, "exec_workload.py")]
+
+
+def shard_workload(workload_file, shard_paths):
+	"""
+	Deal the arrivals round-robin to the shards. Every shard keeps the absolute arrival times of
+	its tasks (IATs are recomputed against the shard's previous arrival), so the shards together
+	replay the original trace once they start from the same instant.
+	"""
+	shards = [open(path, "w") for path in shard_paths]
+	last_arrival = [0.0] * len(shards)
+	arrival = 0.0
+
+	try:
+		for iat, arg, i in exec_utils.read_workload(workload_file):
+			arrival += iat
+			k = i % len(shards)
+			shards[k].write(f"{arrival - last_arrival[k]} {arg}\n")
+			last_arrival[k] = arrival
+	finally:
+		for f in shards:
+			f.close()
+
+
+def merge_results(generator_outputs, outputfile):
+	# Rows are put back in arrival order, the order a single generator logs them in
+	if all(timings_path(out) is not None for out in generator_outputs):
+		timing_df = pd.concat([read_timings(out) for out in generator_outputs], ignore_index=True)
+		timing_df = timing_df.sort_values("request_time", kind="stable")
+		timing_df.to_csv(f"{outputfile}_timings.csv", index=False)
+		lines = [f"{pid} {arg}" for pid, arg in zip(timing_df["pid"], timing_df["arg"])]
+	else:
+		lines = []
+		for out in generator_outputs:
+			with open(f"{out}_pids.txt", "r") as f:
+				lines.extend(line.strip() for line in f if line.strip())
+
+	with open(f"{outputfile}_pids.txt", "w") as f:
+		f.write("\n".join(lines) + "\n")
+	print(f"{Fore.CYAN}Run {len(lines)} tasks. Pids saved in {outputfile}_pids.txt{Style.RESET_ALL}")
+
+	# Dispatch precision is per generator, each keeps its own report
+	for k, out in enumerate(generator_outputs):
+		if os.path.exists(f"{out}_dispatch.txt"):
+			shutil.copyfile(f"{out}_dispatch.txt", f"{outputfile}_generator_{k}_dispatch.txt")
+
+
+def main(outputfile, generators, generator_cpus, start_delay, time_log=False, cpu_log=False,
+		 workload_file=workload_file, generator_args=(), cpu_interval=0.2,
+		 cpu_log_format="csv"):
+	housekeeping = ",".join(str(c) for c in sorted(set(generator_cpus)))
+	os.sched_setaffinity(0, set(generator_cpus))
+
+	with tempfile.TemporaryDirectory() as tmp:
+		shard_paths = [os.path.join(tmp, f"shard_{k}.txt") for k in range(generators)]
+		generator_outputs = [os.path.join(tmp, f"generator_{k}") for k in range(generators)]
+		shard_workload(workload_file, shard_paths)
+
+		# Generators share CLOCK_MONOTONIC, the delay covers their startup before the barrier
+		start_at = time.monotonic() + start_delay
+		start_simulation = time.time() + start_delay
+
+		if cpu_log:
+			start_cpu_monitoring(cpu_interval)
+
+		procs = []
+		for k in range(generators):
+			cmd = exec_workload_cmd + [
+				"--outputfile", generator_outputs[k],
+				"--workload_file", shard_paths[k],
+				"--start_at", repr(start_at),
+				"--generator_cpu", str(generator_cpus[k % len(generator_cpus)]),
+				"--housekeeping_cpus", housekeeping,
+				*generator_args,
+			]
+			procs.append(subprocess.Popen(cmd))
+		print(f"{Fore.GREEN}Started {generators} generators on CPUs {housekeeping}, "
+			  f"dispatch starts in {start_delay:.1f} s{Style.RESET_ALL}")
+
+		failed = [k for k, proc in enumerate(procs) if proc.wait() != 0]
+		end_simulation = time.time()
+
+		if failed:
+			print(f"{Fore.RED}Generators {failed} failed, results not merged{Style.RESET_ALL}")
+			exit(-1)
+
+		print(f"{Fore.GREEN}Total time elapsed: {end_simulation - start_simulation:.2f} s{Style.RESET_ALL}")
+		if time_log:
+			exec_utils.log_total_time(outputfile, end_simulation - start_simulation)
+
+		stop_cpu_monitoring(outputfile, start_simulation, end_simulation, cpu_log_format)
+		merge_results(generator_outputs, outputfile)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Shard the workload over several generator processes, "
+					"unknown arguments are passed on to every exec_workload.py generator")
+	parser.add_argument("--outputfile", type=str, help="Output file name")
+	parser.add_argument("--generators", type=int, default=2, help="Number of generator processes")
+	parser.add_argument("--generator_cpus", type=str, default=None,
+						help="Comma separated housekeeping CPUs the generators are pinned to (default: one per generator from CPU 0)")
+	parser.add_argument("--start_delay", type=float, default=2.0, help="Seconds between launching the generators and the start barrier")
+	parser.add_argument("--time_log", action="store_true", help="Enable time log", default=False)
+	parser.add_argument("--cpu_log", action="store_true", help="Enable CPU log", default=False)
+	parser.add_argument("--cpu_interval", type=float, default=0.2, help="Seconds between CPU utilization samples (down to 0.01)")
+	parser.add_argument("--cpu_log_format", type=str, choices=CPU_LOG_FORMATS, default="csv",
+						help="_cpu_util.csv, or _cpu_util.bin: header plus float32 matrix")
+	parser.add_argument("--workload_file", type=str, default=workload_file, help="Workload trace to replay")
+	args, generator_args = parser.parse_known_args()
+
+	if args.generator_cpus:
+		generator_cpus = [int(c) for c in args.generator_cpus.split(",")]
+	else:
+		generator_cpus = list(range(args.generators))
+
+	main(args.outputfile, args.generators, generator_cpus, args.start_delay, args.time_log, args.cpu_log,
+		 args.workload_file, generator_args, args.cpu_interval, args.cpu_log_format)
@@ -2,6 +2,7 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
 import matplotlib.pyplot as plt
 
 dur_df_list = []
@@ -11,6 +12,8 @@ days = [
 ]
 
 __file = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(__file))
+from utils.calibration import load_table
 
 # ---------------------------------------------------------
 # 1. Load Two-Week Azure CDF
@@ -58,8 +61,7 @@ cdf_2min = np.cumsum(p_2min)
 # ---------------------------------------------------------
 # 3. Load Generated Workload CDF
 # ---------------------------------------------------------
-dur_list = [7, 8, 9, 10, 12, 14, 17, 21, 27, 39, 56, 85, 131, 205, 325, 520, 838, 1347, 2175, 3512, 5673, 9172, 14835]
-fib = [24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 43, 44, 45, 46]
+fib, dur_list = load_table()
 arg_to_duration = dict(zip(fib, dur_list))
 
 workload_file = f"{__file}/workload_dur.txt"
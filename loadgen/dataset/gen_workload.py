@@ -3,15 +3,20 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
 import argparse
 from collections import defaultdict
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Generate workload with configurable downscale factor')
 parser.add_argument('--downscale', type=float, default=100, help='Downscale factor for function invocations (default: 700)')
+parser.add_argument('--unit', choices=['fib', 'ms'], default='fib',
+                    help='fib: bucket durations into fib arguments, ms: keep the duration in milliseconds (exec_workload.py --payload burn)')
 args = parser.parse_args()
 
 __file = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(__file))
+from utils.calibration import load_table
 durations_file = f"{__file}/trace/function_durations_percentiles.anon.d01.csv"
 invoke_file = f"{__file}/trace/invocations_per_function_md.anon.d01.csv"
 workload_file = f"{__file}/workload_dur.txt"
@@ -39,24 +44,33 @@ duration_occurrence = pd.DataFrame.from_dict(duration_dict, orient="index")
 duration_occurrence.index.name = "Duration"
 duration_occurrence.reset_index(inplace=True)
 
+# According to calibration, function duration and the corresponding fib N's (this host's calibrate.py profile)
+fib, dur_list = load_table()
+
 bucket = {}
-for i in range(24, 47):
+for i in fib:
     bucket[i] = [0] * 2
 
-# According to calibration, function duration and the corresponding fib N's
-dur_list = [7, 8, 9, 10, 12, 14, 17, 21, 27, 39, 56, 85, 131, 205, 325, 520, 838, 1347, 2175, 3512, 5673, 9172, 14835]
-fib = [24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 43, 44, 45, 46]
-
-for index, row in duration_occurrence.iterrows():
-    Duration = list(row)[0]
-    occur_list = list(row)[1:]
-    for i in range(len(dur_list)):
-        if Duration <= dur_list[i] or i == len(dur_list) - 1 and Duration > dur_list[i]:
-            # Bucket the function invocation based on the duration
-            bucket[fib[i]] = list(
-                map(lambda x: x[0] + x[1], zip(bucket[fib[i]], occur_list))
-            )
-            break
+if args.unit == "ms":
+    # The burn payload runs any duration, bucket by the average duration rounded to whole ms
+    bucket = defaultdict(lambda: [0] * 2)
+    for index, row in duration_occurrence.iterrows():
+        Duration = list(row)[0]
+        occur_list = list(row)[1:]
+        ms = max(1, int(round(Duration)))
+        bucket[ms] = list(map(lambda x: x[0] + x[1], zip(bucket[ms], occur_list)))
+    bucket = dict(sorted(bucket.items()))
+else:
+    for index, row in duration_occurrence.iterrows():
+        Duration = list(row)[0]
+        occur_list = list(row)[1:]
+        for i in range(len(dur_list)):
+            if Duration <= dur_list[i] or i == len(dur_list) - 1 and Duration > dur_list[i]:
+                # Bucket the function invocation based on the duration
+                bucket[fib[i]] = list(
+                    map(lambda x: x[0] + x[1], zip(bucket[fib[i]], occur_list))
+                )
+                break
 
 arg_df = pd.DataFrame.from_dict(bucket, orient="index")
 arg_df.index.name = "arg"
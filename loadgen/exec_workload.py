@@ -1,211 +1,501 @@
 #!/usr/bin/python3
 import time
 import argparse
-import subprocess
 import threading
 import queue
+import select
 import os
 import utils.exec_utils as exec_utils
-from utils.cpu_monitoring import start_cpu_monitoring, stop_cpu_monitoring
+from utils.spawn import (make_spawner, workload_cpus, read_output, rusage_fields, completion_channel, payload_options,
+						 SPAWN_MODES, COMPLETION_MODES, PAYLOADS, BURN_PROFILES)
+from utils.warm_pool import WarmPool
+from utils.dispatch import hybrid_dispatch, deadline_dispatch, DISPATCHERS
+from utils.load_control import InFlightLimit, closed_loop_dispatch, LOAD_MODES
+from utils.telemetry import DispatchTelemetry
+from utils.launcher_pool import LauncherPool
+from utils.cgroups import CgroupPlacement
+from utils.metrics import LiveMetrics, MetricsExporter
+from utils.columnar import ColumnarResultStream, RESULT_FORMATS
+from utils.checkpoint import Checkpoint
+from utils.task_schedstat import TaskSchedstat
+from utils.classes import load_classes, ClassedWorkload, ClassTally, log_class_summary
+import utils.async_backend as async_backend
+from utils.cpu_monitoring import start_cpu_monitoring, stop_cpu_monitoring, CPU_LOG_FORMATS
 from colorama import Fore, Style
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
 workload_file = os.path.join(script_dir, "dataset/workload_dur.txt")
 cpu_count = os.cpu_count()
 
-# Thread-safe dictionary: { pid: (arg, request_time, index, Popen_object) }
+# Thread-safe dictionary: { pid: (arg, request_time, index, Popen_object, extra) }
 active_tasks = {}
 tasks_lock = threading.Lock()
 
-# Event to signal when the main loop has finished dispatching all tasks
+# Exit notifications: every launched task registers a pidfd here, which becomes
+# readable as soon as the kernel marks the child as exited. { pidfd: pid }
+exit_epoll = select.epoll()
+pidfds = {}
+
+# Event to signal when the main loop has finished dispatching all tasks, dispatched_tasks is
+# final once it is set. The eventfd wakes a reaper blocked in epoll to re-check it.
 dispatch_complete = threading.Event()
+dispatched_tasks = 0
+dispatch_done_fd = os.eventfd(0, os.EFD_CLOEXEC)
+exit_epoll.register(dispatch_done_fd, select.EPOLLIN)
 
-def launcher_worker(task_queue, fifo, sched_ext):
-	base_cmd = [f"{script_dir}/payload/launch_function.out"]
-	if sched_ext:
-		base_cmd = [f"{script_dir}/payload/run_with_sched_ext"] + base_cmd
+def track_task(proc, arg, request_time, index, extra):
+	with tasks_lock:
+		active_tasks[proc.pid] = (arg, request_time, index, proc, extra)
 
+		# The child cannot be reaped before it is registered (only the reaper
+		# waits on registered pids), so the pidfd is valid even if it already exited.
+		pidfd = os.pidfd_open(proc.pid)
+		pidfds[pidfd] = proc.pid
+		exit_epoll.register(pidfd, select.EPOLLIN)
 
-	cpu_list = ",".join(str(c) for c in range(1, cpu_count))
+def launcher_worker(task_queue, spawners, pool):
+	perf_counter = time.perf_counter
 
 	while True:
 		try:
-			item = task_queue.get(timeout=3)
+			item = task_queue.get(timeout=pool.interval)
 		except queue.Empty:
-			return
+			# Idle, leave if the pool has more launchers than it needs
+			if pool.should_retire():
+				return
+			continue
 
 		if item is None:
 			task_queue.task_done()
 			break
 
-		arg, index, request_time = item
+		arg, index, request_time, extra, queued_at = item
 
 		try:
-			cmd = ["nice", "-n", "15", "taskset", "-c", cpu_list]
-			if fifo:
-				cmd.extend(["chrt", "-f", "50"])
-
-			full_cmd = cmd + base_cmd + [arg]
-
-			with tasks_lock:
-				proc = subprocess.Popen(
-					full_cmd,
-					stdout=subprocess.PIPE,
-					stderr=subprocess.PIPE,
-					text=True
-				)
-				active_tasks[proc.pid] = (arg, request_time, index, proc)
+			spawn_start = perf_counter()
+			extra['queue_wait'] = spawn_start - queued_at
+			# Single-class runs have the one spawner under None
+			proc = spawners[extra.get('class')](arg)
+			extra['spawn_cost'] = perf_counter() - spawn_start
+			pool.observe(extra['spawn_cost'])
+			track_task(proc, arg, request_time, index, extra)
 
 		except Exception as e:
 			print(f"Launcher Error: {e}")
 		finally:
 			task_queue.task_done()
 
-def reaper_thread(results, total_tasks):
+def release_warm(pool, arg, index, request_time, extra, cgroups=None):
+	# Hand the argument to a parked payload, False if the pool is empty
+	release_start = time.perf_counter()
+	proc = pool.acquire()
+	if proc is None:
+		return False
+
+	extra['warm'] = 1
+	# Parked payloads have no class yet, they join it before they get their argument
+	if cgroups is not None:
+		cgroups.place(proc.pid, arg)
+	track_task(proc, arg, request_time, index, extra)
+	proc.stdin.write(f"{arg}\n")
+	proc.stdin.close()
+	extra['spawn_cost'] = time.perf_counter() - release_start
+	return True
+
+def reaper_thread(results, limiter=None, metrics=None, schedstat=None):
 	reaped_count = 0
+	get_time = time.time
 
-	while reaped_count < total_tasks:
+	# The number of tasks is only known once dispatching ends (streamed workloads)
+	while not (dispatch_complete.is_set() and reaped_count >= dispatched_tasks):
 		try:
-			# Block until a child process exits.
-			pid, status = os.wait()
+			# Block until at least one pidfd reports an exited child, no polling needed
+			events = exit_epoll.poll()
 
-			task_info = None
-			with tasks_lock:
-				task_info = active_tasks.pop(pid, None)
+			# Take the timestamp before any other work, all children in this wakeup exited before it
+			return_time = get_time()
 
-			if task_info:
-				arg, request_time, index, proc = task_info
-
-				stdout = proc.stdout.read().strip()
-				proc.stdout.close()
-
-				# This introduces some jitter as it's not exactly when the process ended,
-				# but it's close enough for our purposes.
-				return_time = time.time()
+			finished = []
+			with tasks_lock:
+				for pidfd, _ in events:
+					if pidfd == dispatch_done_fd:
+						exit_epoll.unregister(dispatch_done_fd)
+						continue
+					pid = pidfds.pop(pidfd)
+					exit_epoll.unregister(pidfd)
+					finished.append((pidfd, pid, active_tasks.pop(pid)))
+
+			# Reap and collect stdout and resource usage outside the timing path
+			for pidfd, pid, (arg, request_time, index, proc, extra) in finished:
+				# Still a zombie, its schedstat goes away with the wait
+				if schedstat is not None:
+					extra.update(schedstat.at_exit(pid))
+				_, status, rusage = os.wait4(pid, 0)
+				os.close(pidfd)
+				extra.update(rusage_fields(rusage))
+
+				output = read_output(proc)
 
 				if status != 0:
 					if os.WIFEXITED(status) and os.WEXITSTATUS(status) != 0:
 						print(f"Process {arg} failed with {os.WEXITSTATUS(status)}")
 
-				results[index] = (stdout, arg, request_time, return_time)
+				results[index] = (output, arg, request_time, return_time, extra)
 				reaped_count += 1
-			else:
-				print(f"Reaper Warning: Unknown PID {pid} reaped.")
-
-		except ChildProcessError:
-			# os.wait() throws this error if there are no running children.
-			# this might happen at the very start (before the first launcher fires)
-			# or if there is a massive gap in the workload.
-			# We sleep briefly to let the Launchers catch up.
-			time.sleep(0.001)
-			continue
+				if metrics is not None:
+					metrics.complete(request_time, return_time)
+
+				if limiter is not None:
+					limiter.done()
 
 		except Exception as e:
 			print(f"Reaper Error: {e}")
 			break
 
-def main(outputfile, time_log=False, cpu_log=False, fifo=False, sched_ext=False, no_log=False):
-	os.sched_setaffinity(0, {0})
+def main(outputfile, time_log=False, cpu_log=False, fifo=False, sched_ext=False, no_log=False, spawn_mode="chain",
+		 warm_pool=False, warm_pool_size=0, dispatcher="hybrid", spin_window=0.0002, backend="threaded",
+		 workload_file=workload_file, stream=False, completion="pipe", start_at=None, generator_cpu=0,
+		 housekeeping_cpus=(0,), load_mode="open", max_in_flight=0, dispatch_trace=False, burst_threshold=0.001,
+		 launchers=(1, 4, 16), payload="fib", profile="cpu", cgroup_root=None, cgroup_interval=0.1,
+		 metrics_port=None, metrics_socket=None, result_format="csv",
+		 checkpoint_interval=None, resume=False, classes_file=None,
+		 cpu_interval=0.2, task_schedstat=False, task_schedstat_interval=0.0, cpu_log_format="csv",
+		 mem_mb=None):
+	os.sched_setaffinity(0, {generator_cpu})
 	os.nice(-15)
 	exec_utils.set_ulimit()
 
 	if cpu_log:
-		start_cpu_monitoring()
+		# The sampler process stays off the workload CPUs
+		start_cpu_monitoring(cpu_interval, set(housekeeping_cpus))
 
-	with open(workload_file, "r") as f:
-		lines = f.readlines()
+	cpus = workload_cpus(cpu_count, housekeeping_cpus)
 
-	workload = []
-	for i, line in enumerate(lines):
-		iat, arg = line.strip().split(" ")
-		workload.append((float(iat), str(arg), i))
-	workload.reverse()
+	classes = None
+	if classes_file:
+		# Several workload streams replayed together, each class with its own scheduling attributes
+		classes = ClassedWorkload(load_classes(classes_file, cpus))
+		source = classes
+	else:
+		source = exec_utils.read_workload(workload_file)
 
-	results = [None] * len(lines)
-	task_queue = queue.Queue()
+	if stream:
+		# Arrivals are read lazily and every result is written out as soon as the task completes
+		workload = source
+	else:
+		workload = list(source)
+
+	columns = exec_utils.timing_columns(backend, spawn_mode, load_mode, max_in_flight, warm_pool, classes is not None,
+										checkpoint_interval or resume, task_schedstat)
+	if result_format != "csv":
+		# Results go out in record batches as tasks complete, streamed or not
+		results = ColumnarResultStream(outputfile, columns, result_format, payload, timings=not no_log)
+	elif stream:
+		results = exec_utils.ResultStream(outputfile, columns, timings=not no_log)
+	else:
+		results = [None] * len(workload)
+
+	# Per-class response times are kept apart from the results, which a streamed run does not hold
+	tally = results if classes is None else ClassTally(results, classes.classes)
+
+	checkpoint = None
+	if checkpoint_interval or resume:
+		checkpoint = Checkpoint(outputfile, checkpoint_interval or 10.0, resume)
+		# Results of earlier segments go out first, the backend fills the rest through the journal
+		workload = checkpoint.remaining(workload)
+		if not stream:
+			workload = list(workload)
+		checkpoint.restore(tally)
+		checkpoint.start()
+	sink = tally if checkpoint is None else checkpoint.wrap(tally)
+
+	if warm_pool and not warm_pool_size:
+		warm_pool_size = exec_utils.estimate_peak_concurrency(exec_utils.read_workload(workload_file), payload)
+
+	channel = completion_channel(completion)
+	stdout = channel.fd if channel is not None else None
+	telemetry = DispatchTelemetry(dispatch_trace, burst_threshold)
+	payload_args = payload_options(payload, profile, mem_mb)
+
+	cgroups = None
+	if cgroup_root:
+		cgroups = CgroupPlacement(cgroup_root, payload, cgroup_interval)
+		cgroups.start()
+
+	metrics = exporter = None
+	if metrics_port is not None or metrics_socket is not None:
+		metrics = LiveMetrics(telemetry)
+		exporter = MetricsExporter(metrics, metrics_port, metrics_socket)
+		exporter.start()
+
+	if backend == "asyncio":
+		print(f"{Fore.GREEN}Starting simulation: asyncio event loop, {spawn_mode} spawn{Style.RESET_ALL}")
+		start_simulation = async_backend.run(workload, results, cpus, fifo, sched_ext, spawn_mode, spin_window, stdout,
+											 start_at, telemetry, payload_args, cgroups, metrics)
+	else:
+		start_simulation = run_threaded(workload, sink, outputfile, cpus, fifo, sched_ext, spawn_mode, warm_pool,
+										warm_pool_size, dispatcher, spin_window, stdout, start_at, load_mode,
+										max_in_flight, telemetry, launchers, payload_args, cgroups, metrics,
+										checkpoint, classes, task_schedstat, task_schedstat_interval)
 
-	# Start reaper (collect finishing tasks)
-	reaper = threading.Thread(target=reaper_thread, args=(results, len(lines)))
-	reaper.start()
+	end_simulation = time.time()
+	print(f"{Fore.GREEN}Total time elapsed: {end_simulation - start_simulation:.2f} s{Style.RESET_ALL}")
 
-	# Start launchers
-	num_launchers = 4
-	launchers = []
-	print(f"{Fore.GREEN}Starting simulation: 1 Reaper, {num_launchers} Launchers{Style.RESET_ALL}")
+	if cgroups is not None:
+		cgroups.stop(outputfile)
+	if exporter is not None:
+		exporter.stop()
+	if checkpoint is not None:
+		checkpoint.close()
+		# Tasks lost in an interruption have no result
+		if isinstance(results, list):
+			results = [result for result in results if result is not None]
+
+	if channel is not None:
+		channel.close()
+		if channel.records is not None:
+			print(f"{Fore.CYAN}{channel.records} completion records on the shared pipe{Style.RESET_ALL}")
 
-	for _ in range(num_launchers):
-		t = threading.Thread(target=launcher_worker, args=(task_queue, fifo, sched_ext))
-		t.start()
-		launchers.append(t)
+	if time_log:
+		exec_utils.log_total_time(outputfile, end_simulation - start_simulation)
 
-	start_simulation = time.time()
-	next_request_time = start_simulation
-	total_tasks = len(lines)
-	dispatched = 0
+	stop_cpu_monitoring(outputfile, start_simulation, end_simulation, cpu_log_format)
 
-	get_time = time.time
-	sleep = time.sleep
+	telemetry.write(outputfile, start_simulation)
+	if dispatch_trace and len(telemetry.actual):
+		exec_utils.debug_iat(*telemetry.iat_trace(start_simulation), start_simulation, outputfile)
 
-	# Main loop: dispatch tasks according to IATs
-	while dispatched < total_tasks:
-		IAT, arg, index = workload.pop()
-		next_request_time += IAT
+	if classes is not None:
+		log_class_summary(tally.durations, classes.classes, outputfile)
 
-		now = get_time()
+	if not isinstance(results, list):
+		results.close()
+	else:
+		exec_utils.print_spawn_cost(results, spawn_mode)
+
+		if not no_log:
+			exec_utils.log_tasks_output(results, outputfile)
+		else:
+			exec_utils.debug_output_pids(results, outputfile)
+
+	if checkpoint is not None:
+		checkpoint.finish()
+
+def run_threaded(workload, results, outputfile, cpus, fifo, sched_ext, spawn_mode, warm_pool, warm_pool_size, dispatcher,
+				 spin_window, stdout=None, start_at=None, load_mode="open", max_in_flight=0, telemetry=None,
+				 launchers=(1, 4, 16), payload_args=(), cgroups=None, metrics=None, checkpoint=None, classes=None, task_schedstat=False,
+				 task_schedstat_interval=0.0):
+	task_queue = queue.Queue()
+	if classes is None:
+		spawners = {None: make_spawner(spawn_mode, cpus, fifo, sched_ext, stdout=stdout, payload_args=payload_args)}
+	else:
+		# Class nice is absolute, the spawners apply theirs relative to the generator's -15
+		own_nice = os.getpriority(os.PRIO_PROCESS, 0)
+		spawners = {c.name: make_spawner(spawn_mode, c.cpus, stdout=stdout, payload_args=payload_args,
+										 nice=c.nice - own_nice, policy=c.policy)
+					for c in classes.classes}
+	if cgroups is not None:
+		spawners = {name: cgroups.wrap(spawn) for name, spawn in spawners.items()}
+
+	pool = None
+	if warm_pool:
+		pool = WarmPool(make_spawner(spawn_mode, cpus, fifo, sched_ext, warm=True, stdout=stdout, payload_args=payload_args),
+						warm_pool_size)
+		pool.start()
+		print(f"{Fore.GREEN}Warm pool ready with {warm_pool_size} parked processes{Style.RESET_ALL}")
 
-		if now < next_request_time:
-			diff = next_request_time - now
+	dispatched = 0
 
-			# Sleep in a hybrid manner to reduce CPU usage while maintaining timing accuracy
-			if diff > 0.002:
-				sleep(diff - 0.001)
+	def release(arg, index, request_time, extra):
+		if pool is not None:
+			if release_warm(pool, arg, index, request_time, extra, cgroups):
+				return
+			extra['warm'] = 0
+		task_queue.put((arg, index, request_time, extra, time.perf_counter()))
 
-			# If still time left, busy-wait
-			while get_time() < next_request_time:
-				pass
+	# Arrivals beyond the in-flight cap (or the closed-loop users) wait at the generator
+	limiter = InFlightLimit(max_in_flight, release) if max_in_flight else None
 
-		task_queue.put((arg, index, next_request_time))
+	def admit(arg, index, request_time, extra):
+		nonlocal dispatched
 		dispatched += 1
+		if metrics is not None:
+			metrics.dispatch()
+		if checkpoint is not None:
+			checkpoint.dispatched(index)
+		if classes is not None:
+			extra['class'] = classes.name_of(index)
+		# The closed loop has no intended fire times
+		if telemetry is not None and 'lateness' in extra:
+			telemetry.record(arg, request_time, extra['lateness'])
+		if limiter is not None and load_mode == "open":
+			limiter.admit(arg, index, request_time, extra)
+		else:
+			release(arg, index, request_time, extra)
+
+	schedstat = None
+	if task_schedstat:
+		schedstat = TaskSchedstat(lambda: list(active_tasks), task_schedstat_interval)
+		schedstat.start()
+
+	# Start reaper (collect finishing tasks)
+	reaper = threading.Thread(target=reaper_thread, args=(results, limiter, metrics, schedstat))
+	reaper.start()
+
+	# Start launchers, the pool resizes itself from the spawn backlog
+	min_launchers, initial_launchers, max_launchers = launchers
+	launcher_pool = LauncherPool(task_queue, lambda p: launcher_worker(task_queue, spawners, p),
+									 min_launchers, initial_launchers, max_launchers)
+	if checkpoint is not None:
+		def spawned_pids():
+			with tasks_lock:
+				return {task[2]: pid for pid, task in active_tasks.items()}
+		checkpoint.pids = spawned_pids
+	if metrics is not None:
+		metrics.gauges["in_flight"] = lambda: len(active_tasks)
+		metrics.gauges["launch_queue_depth"] = task_queue.qsize
+		metrics.gauges["launchers"] = lambda: launcher_pool.active
+		if limiter is not None:
+			metrics.gauges["generator_backlog"] = lambda: len(limiter.pending)
+	print(f"{Fore.GREEN}Starting simulation: 1 Reaper, {launcher_pool.initial} Launchers "
+		  f"({launcher_pool.min}-{launcher_pool.max}), {spawn_mode} spawn{Style.RESET_ALL}")
+	if load_mode == "closed":
+		print(f"{Fore.GREEN}Closed loop with {max_in_flight} users{Style.RESET_ALL}")
+
+	launcher_pool.start()
+
+	# Main loop: dispatch tasks according to IATs, or on completions in the closed loop
+	if load_mode == "closed":
+		start_simulation = closed_loop_dispatch(workload, admit, limiter, start_at)
+	elif dispatcher == "deadline":
+		start_simulation = deadline_dispatch(workload, admit, spin_window, start_at)
+	else:
+		start_simulation = hybrid_dispatch(workload, admit, start_at)
 
 	print(f"{Fore.GREEN}Main loop finished dispatching after {time.time()-start_simulation:.2f}s{Style.RESET_ALL}")
 
 	# Signal completion
+	global dispatched_tasks
+	dispatched_tasks = dispatched
 	dispatch_complete.set()
+	os.eventfd_write(dispatch_done_fd, 1)
 
-	# Cleanup launchers
-	task_queue.join()
-	for _ in range(num_launchers):
-		task_queue.put(None)
-	for t in launchers:
-		t.join()
-
+	# Queued arrivals are still released by the reaper, launchers stay up until everything is reaped
 	print(f"{Fore.GREEN}Waiting for reaper to collect results...{Style.RESET_ALL}")
 	reaper.join()
 
-	end_simulation = time.time()
-	print(f"{Fore.GREEN}Total time elapsed: {end_simulation - start_simulation:.2f} s{Style.RESET_ALL}")
+	if schedstat is not None:
+		schedstat.stop()
 
-	if time_log:
-		exec_utils.log_total_time(outputfile, end_simulation - start_simulation)
+	# Cleanup launchers
+	launcher_pool.stop()
+	launcher_pool.log(outputfile)
 
-	stop_cpu_monitoring(outputfile, start_simulation, end_simulation)
+	if pool is not None:
+		pool.close()
 
-	if not no_log:
-		exec_utils.log_tasks_output(results, outputfile)
-	else:
-		exec_utils.debug_output_pids(results, outputfile)
+	if pool is not None:
+		exec_utils.log_warm_pool(pool.stats(), outputfile)
+	if limiter is not None and load_mode == "open":
+		stats = limiter.stats()
+		print(f"{Fore.CYAN}In-flight cap {stats['limit']}: {stats['queued']} arrivals queued at the generator, "
+			  f"max backlog {stats['max_pending']}{Style.RESET_ALL}")
+
+	return start_simulation
 
 if __name__ == "__main__":
 	parser = argparse.ArgumentParser()
 	parser.add_argument("--outputfile", type=str, help="Output file name")
 	parser.add_argument("--time_log", action="store_true", help="Enable time log", default=False)
 	parser.add_argument("--cpu_log", action="store_true", help="Enable CPU log", default=False)
+	parser.add_argument("--cpu_interval", type=float, default=0.2, help="Seconds between CPU utilization samples (down to 0.01)")
+	parser.add_argument("--cpu_log_format", type=str, choices=CPU_LOG_FORMATS, default="csv",
+						help="_cpu_util.csv, or _cpu_util.bin: header plus float32 matrix, for long high-resolution logs")
 	parser.add_argument("--fifo", action="store_true", help="Use FIFO scheduling", default=False)
 	parser.add_argument("--sched_ext", action="store_true", help="Use sched_ext scheduler", default=False)
 	parser.add_argument("--no_log", action="store_true", help="Disable logging", default=False)
+	parser.add_argument("--spawn", type=str, choices=SPAWN_MODES, default="chain",
+						help="chain: nice/taskset/chrt wrappers, direct: posix_spawn the payload and set its attributes from the launcher before releasing it")
+	parser.add_argument("--warm_pool", action="store_true", help="Release pre-spawned payloads instead of spawning on arrival", default=False)
+	parser.add_argument("--warm_pool_size", type=int, default=0, help="Parked processes in the warm pool (0: peak concurrency of the trace)")
+	parser.add_argument("--dispatcher", type=str, choices=DISPATCHERS, default="hybrid",
+						help="hybrid: wall-clock sleep + 1 ms busy-wait, deadline: absolute CLOCK_MONOTONIC deadlines")
+	parser.add_argument("--spin_window", type=float, default=0.0002, help="Seconds the deadline dispatcher spins before each deadline")
+	parser.add_argument("--backend", type=str, choices=("threaded", "asyncio"), default="threaded",
+						help="threaded: dispatcher, launcher and reaper threads, asyncio: one event loop (deadline dispatch, no warm pool)")
+	parser.add_argument("--workload_file", type=str, default=workload_file, help="Workload trace to replay")
+	parser.add_argument("--stream", action="store_true", default=False,
+						help="Read arrivals lazily and write results as tasks complete (constant memory)")
+	parser.add_argument("--completion", type=str, choices=COMPLETION_MODES, default="pipe",
+						help="pipe: stdout pipe per task, shared: one pipe for all payloads, none: discard payload output")
+	parser.add_argument("--start_at", type=float, default=None,
+						help="CLOCK_MONOTONIC time to start dispatching at (start barrier set by coordinator.py)")
+	parser.add_argument("--generator_cpu", type=int, default=0, help="CPU the generator runs on")
+	parser.add_argument("--housekeeping_cpus", type=str, default="0",
+						help="Comma separated CPUs functions are kept off (generators, coordinator)")
+	parser.add_argument("--load_mode", type=str, choices=LOAD_MODES, default="open",
+						help="open: fire at trace IATs, closed: --max_in_flight virtual users issue the trace back to back")
+	parser.add_argument("--max_in_flight", type=int, default=0,
+						help="Cap on running tasks, arrivals beyond it queue at the generator (0: no cap). Users in the closed loop")
+	parser.add_argument("--dispatch_trace", action="store_true", default=False,
+						help="Also keep intended and actual fire time per task and write _IAT.txt and _IAT_diff.txt")
+	parser.add_argument("--burst_threshold", type=float, default=0.001,
+						help="Lateness (s) above which consecutive dispatches count as a burst in _dispatch.txt")
+	parser.add_argument("--launchers", type=str, default="1,4,16",
+						help="min,initial,max launcher threads, the pool resizes within min-max from the spawn backlog")
+	parser.add_argument("--payload", type=str, choices=PAYLOADS, default="fib",
+						help="fib: workload arguments are fib N's, burn: milliseconds of CPU time (gen_workload.py --unit ms)")
+	parser.add_argument("--profile", type=str, choices=BURN_PROFILES, default="cpu",
+						help="Burn payload profile, cpu: spin, mem: CPU plus memory-bandwidth walk, io: CPU plus short sleeps")
+	parser.add_argument("--mem_mb", type=int, default=None,
+						help="Buffer every mem profile task walks, in MB (payload default 64). RSS grows with it times the running tasks")
+	parser.add_argument("--cgroup_root", type=str, default=None,
+						help="Place every task in a cgroup v2 per size class under this directory (e.g. /sys/fs/cgroup/loadgen/functions) "
+							 "and sample their cpu.stat and cpu.pressure into _cgroups.csv")
+	parser.add_argument("--cgroup_interval", type=float, default=0.1, help="Seconds between cgroup samples")
+	parser.add_argument("--metrics_port", type=int, default=None,
+						help="Serve live counters on 127.0.0.1:PORT, /metrics (Prometheus text) and /metrics.json")
+	parser.add_argument("--metrics_socket", type=str, default=None,
+						help="UNIX socket that answers every connection with a JSON snapshot of the live counters")
+	parser.add_argument("--result_format", type=str, choices=RESULT_FORMATS, default="csv",
+						help="_timings file format, arrow (IPC file) and parquet are written in record batches as tasks complete (needs pyarrow)")
+	parser.add_argument("--checkpoint", type=float, default=None, metavar="SECONDS",
+						help="Journal results as they complete and checkpoint the dispatch cursor every SECONDS")
+	parser.add_argument("--resume", action="store_true", default=False,
+						help="Continue the interrupted run of --outputfile from its last checkpoint, the outputs cover all segments")
+	parser.add_argument("--classes", type=str, default=None,
+						help="JSON list of workload classes replayed together, each with its workload_file, absolute nice, policy "
+							 "(other, fifo, ext, batch, idle) and cpus. Rows get a class column, replaces --workload_file")
+	parser.add_argument("--task_schedstat", action="store_true", default=False,
+						help="Add run_time, wait_time and timeslices of every task from /proc/<pid>/schedstat, read at its exit")
+	parser.add_argument("--task_schedstat_interval", type=float, default=0.0,
+						help="Also sample the schedstat of all running tasks every this many seconds (0: exit reads only)")
 	args = parser.parse_args()
 
 	if (args.fifo): print(f"{Fore.GREEN}Using FIFO scheduling!{Style.RESET_ALL}")
 	if (args.sched_ext): print(f"{Fore.GREEN}Using sched_ext scheduler!{Style.RESET_ALL}")
-
-	main(args.outputfile, args.time_log, args.cpu_log, args.fifo, args.sched_ext, args.no_log)
+	if args.backend == "asyncio" and (args.warm_pool or args.max_in_flight or args.load_mode != "open"
+									 or args.checkpoint or args.resume):
+		parser.error("--warm_pool, --max_in_flight, --load_mode and --checkpoint are only supported by the threaded backend")
+	if args.classes and (args.backend == "asyncio" or args.warm_pool or args.fifo or args.sched_ext):
+		parser.error("--classes runs on the threaded backend without a warm pool, policies are set per class")
+	if args.task_schedstat and args.backend == "asyncio":
+		parser.error("--task_schedstat is only supported by the threaded backend")
+	if args.result_format != "csv":
+		try:
+			import pyarrow
+		except ImportError:
+			parser.error(f"--result_format {args.result_format} needs pyarrow")
+	if args.load_mode == "closed" and args.max_in_flight < 1:
+		parser.error("--load_mode closed needs the number of users in --max_in_flight")
+
+	main(args.outputfile, args.time_log, args.cpu_log, args.fifo, args.sched_ext, args.no_log, args.spawn,
+		 args.warm_pool, args.warm_pool_size, args.dispatcher, args.spin_window, args.backend, args.workload_file,
+		 args.stream, args.completion, args.start_at, args.generator_cpu,
+		 [int(c) for c in args.housekeeping_cpus.split(",")], args.load_mode, args.max_in_flight,
+		 args.dispatch_trace, args.burst_threshold, tuple(int(n) for n in args.launchers.split(",")),
+		 args.payload, args.profile, args.cgroup_root, args.cgroup_interval,
+		 args.metrics_port, args.metrics_socket, args.result_format,
+		 args.checkpoint, args.resume, args.classes,
+		 args.cpu_interval, args.task_schedstat, args.task_schedstat_interval,
+		 args.cpu_log_format, args.mem_mb)
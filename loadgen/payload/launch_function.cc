@@ -2,6 +2,10 @@
 #include <unistd.h>
 #include <cstdlib>
 #include <fstream>
+#include <string>
+#include <memory>
+#include <ctime>
+#include <algorithm>
 
 unsigned long long fibonacci(int n) {
     if (n <= 1) {
@@ -10,11 +14,96 @@ unsigned long long fibonacci(int n) {
     return fibonacci(n - 1) + fibonacci(n - 2);
 }
 
+// CPU time consumed by this thread, it does not advance while the thread is preempted
+double thread_cpu_ms() {
+    struct timespec ts;
+    clock_gettime(CLOCK_THREAD_CPUTIME_ID, &ts);
+    return ts.tv_sec * 1e3 + ts.tv_nsec / 1e6;
+}
+
+// Default buffer of the mem profile in MB (--mem), larger than the last level cache. Every
+// running mem task holds its own, so the RSS of a replay grows with its concurrency
+const size_t MEM_BUFFER_MB = 64;
+const size_t CACHE_LINE = 64;
+// The io profile sleeps this long after every millisecond of CPU time
+const useconds_t IO_SLEEP_US = 500;
+
+// Burn exactly `ms` of CPU time. cpu: spin, mem: CPU plus a memory-bandwidth walk over a
+// buffer of `mem_bytes`, io: CPU interrupted by short sleeps that stand in for I/O waits.
+void burn(double ms, const std::string &profile, size_t mem_bytes) {
+    double end = thread_cpu_ms() + ms;
+    volatile unsigned long long sink = 0;
+
+    if (profile == "mem") {
+        // Zeroed, the page faults and the memset count against the time budget
+        std::unique_ptr<char[]> buffer(new char[mem_bytes]());
+        size_t offset = 0;
+        while (thread_cpu_ms() < end) {
+            for (int i = 0; i < 1024; i++) {
+                buffer[offset] += 1;
+                offset = (offset + CACHE_LINE) % mem_bytes;
+            }
+        }
+        sink = buffer[0];
+    } else {
+        double next_sleep = thread_cpu_ms() + 1.0;
+        double now;
+        while ((now = thread_cpu_ms()) < end) {
+            for (int i = 0; i < 1000; i++)
+                sink = sink + i;
+            if (profile == "io" && now >= next_sleep) {
+                usleep(IO_SLEEP_US);
+                next_sleep = now + 1.0;
+            }
+        }
+    }
+}
+
 int main(int argc, char *argv[]) {
     std::string pid = std::to_string(getpid());
 
-    int arg = atoi(argv[1]);
+    // launch_function.out [--burn cpu|mem|io] [--mem MB] [--warm] [--hold] <arg>, arg is a fib N or milliseconds with --burn
+    std::string profile;
+    size_t mem_bytes = MEM_BUFFER_MB << 20;
+    bool warm = false;
+    bool hold = false;
+    std::string value;
+    for (int i = 1; i < argc; i++) {
+        std::string opt(argv[i]);
+        if (opt == "--burn" && i + 1 < argc)
+            profile = argv[++i];
+        else if (opt == "--mem" && i + 1 < argc)
+            mem_bytes = std::max(1L, atol(argv[++i])) << 20;
+        else if (opt == "--warm")
+            warm = true;
+        else if (opt == "--hold")
+            hold = true;
+        else
+            value = opt;
+    }
+
+    if (hold) {
+        // Spawned directly, wait until the orchestrator has set affinity, nice and policy and closes stdin
+        char c;
+        while (read(0, &c, 1) > 0)
+            ;
+    }
+
+    if (warm) {
+        // Pre-spawned by the warm pool, block until the orchestrator hands over the argument
+        if (!(std::cin >> value))
+            return 0;
+    }
+
+    if (!profile.empty()) {
+        double ms = atof(value.c_str());
+        burn(ms, profile, mem_bytes);
+        std::cout << pid << ' ' << ms << '\n';
+        return 0;
+    }
+
+    int arg = atoi(value.c_str());
     unsigned long long n = fibonacci(arg);
         std::cout << pid << ' ' << n << '\n';
     return 0;
-}
\ No newline at end of file
+}
@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 import os
 import sys
+import time
+
+# The io profile sleeps this long after every millisecond of CPU time
+IO_SLEEP = 0.0005
+# Default buffer of the mem profile in MB (--mem), same as launch_function.cc
+MEM_BUFFER_MB = 64
+CACHE_LINE = 64
 
 def get_pid():
     pid = os.getpid()
@@ -13,6 +20,25 @@ def fib(n):
     else:
         return fib(n-1) + fib(n-2)
 
+# Burn exactly ms of CPU time, measured with CLOCK_THREAD_CPUTIME_ID so preemption does not count
+def burn(ms, profile, mem_bytes):
+    end = time.thread_time() + ms / 1000
+    if profile == "mem":
+        buffer = bytearray(mem_bytes)
+        offset = 0
+        while time.thread_time() < end:
+            for _ in range(1024):
+                buffer[offset] = (buffer[offset] + 1) & 0xff
+                offset = (offset + CACHE_LINE) % mem_bytes
+    else:
+        next_sleep = time.thread_time() + 0.001
+        while (now := time.thread_time()) < end:
+            for i in range(1000):
+                pass
+            if profile == "io" and now >= next_sleep:
+                time.sleep(IO_SLEEP)
+                next_sleep = now + 0.001
+
 def launch_function(num):
     current_pid = get_pid()
     # command = f"echo {current_pid} > /sys/fs/ghost/enclave_1/tasks"
@@ -23,5 +49,38 @@ def launch_function(num):
 
 
 if __name__ == "__main__":
-    num = int(sys.argv[1])
-    launch_function(num)
\ No newline at end of file
+    # launch_function.py [--burn cpu|mem|io] [--mem MB] [--warm] [--hold] <arg>, arg is a fib N or milliseconds with --burn
+    profile = None
+    mem_bytes = MEM_BUFFER_MB << 20
+    warm = False
+    hold = False
+    value = None
+    argv = iter(sys.argv[1:])
+    for opt in argv:
+        if opt == "--burn":
+            profile = next(argv, profile)
+        elif opt == "--mem":
+            mem_bytes = max(1, int(next(argv, MEM_BUFFER_MB))) << 20
+        elif opt == "--warm":
+            warm = True
+        elif opt == "--hold":
+            hold = True
+        else:
+            value = opt
+
+    if hold:
+        # Spawned directly, wait until the orchestrator has set affinity, nice and policy and closes stdin
+        sys.stdin.buffer.read()
+
+    if warm:
+        # Pre-spawned by the warm pool, block until the orchestrator hands over the argument
+        line = sys.stdin.readline()
+        if not line:
+            sys.exit(0)
+        value = line.strip()
+
+    if profile is not None:
+        burn(float(value), profile, mem_bytes)
+        print(f"{get_pid()}: Finished")
+    else:
+        launch_function(int(value))
@@ -0,0 +1,353 @@
+#!/usr/bin/python3
+# Discrete-event what-if replay of a workload trace: no processes are spawned, durations come
+# from the calibration table and the CPUs are scheduled by a model of the chosen policy
+import os
+import csv
+import heapq
+import argparse
+import itertools
+from abc import ABC, abstractmethod
+from collections import deque
+import numpy as np
+from utils.exec_utils import arg_to_duration, arg_duration_ms, read_workload
+from colorama import Fore, Style
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+workload_file = os.path.join(script_dir, "dataset/workload_dur.txt")
+
+POLICIES = ("fair", "fifo", "serverless")
+
+# Same columns as the parse_trace.py output joined with the _timings.csv of the run
+COLUMNS = ["pid", "arg", "start_time", "startup_latency", "exit_time", "migrations",
+		   "request_time", "return_time", "duration"]
+
+ARRIVAL, SLICE_END, BALANCE = 0, 1, 2
+INF = float("inf")
+
+
+class Task:
+	__slots__ = ("pid", "arg", "arrival", "remaining", "vruntime", "slice", "cpu", "first_run", "migrations")
+
+	def __init__(self, pid, arg, arrival, duration):
+		self.pid = pid
+		self.arg = arg
+		self.arrival = arrival
+		self.remaining = duration
+		self.vruntime = 0.0
+		self.slice = INF
+		self.cpu = None
+		self.first_run = None
+		self.migrations = 0
+
+
+class Simulator(ABC):
+	"""
+	Event loop shared by the policies: arrivals, end of a CPU's current slice and (for the fair
+	policy) periodic load balancing. A task runs at full speed while it is on a CPU, a migration
+	is counted whenever it runs on a CPU other than the last one (the initial placement is not,
+	like parse_trace.py which discounts the affinity move).
+	"""
+
+	def __init__(self, cores):
+		self.cores = cores
+		self.now = 0.0
+		self.events = []
+		self.seq = itertools.count()
+		self.running = [None] * cores
+		self.run_start = [0.0] * cores
+		# Bumped on every context switch so slice-end events of a preempted run are ignored
+		self.run_token = [0] * cores
+		self.in_system = 0
+
+	def schedule(self, time, kind, target=None):
+		heapq.heappush(self.events, (time, next(self.seq), kind, target))
+
+	def idle_cpu(self):
+		for cpu in range(self.cores):
+			if self.running[cpu] is None:
+				return cpu
+		return None
+
+	def start(self, cpu, task):
+		if task.first_run is None:
+			task.first_run = self.now
+		elif task.cpu != cpu:
+			task.migrations += 1
+		task.cpu = cpu
+
+		self.running[cpu] = task
+		self.run_start[cpu] = self.now
+		self.run_token[cpu] += 1
+		self.schedule(self.now + min(task.slice, task.remaining), SLICE_END, (cpu, self.run_token[cpu]))
+
+	def stop(self, cpu):
+		task = self.running[cpu]
+		ran = self.now - self.run_start[cpu]
+		task.remaining -= ran
+		task.vruntime += ran
+		self.running[cpu] = None
+		return task
+
+	def run(self, workload, emit):
+		arrivals = iter(workload)
+
+		def next_arrival():
+			task = next(arrivals, None)
+			if task is not None:
+				self.schedule(task.arrival, ARRIVAL, task)
+
+		next_arrival()
+		while self.events:
+			self.now, _, kind, target = heapq.heappop(self.events)
+
+			if kind == ARRIVAL:
+				# Only one arrival is pending at a time, the trace is read as the clock advances
+				self.in_system += 1
+				self.arrive(target)
+				next_arrival()
+
+			elif kind == SLICE_END:
+				cpu, token = target
+				if token != self.run_token[cpu]:
+					continue
+				task = self.stop(cpu)
+				if task.remaining <= 1e-12:
+					self.in_system -= 1
+					emit(task, self.now)
+				else:
+					self.requeue(cpu, task)
+				self.pick(cpu)
+
+			elif kind == BALANCE:
+				self.balance()
+
+	# The policy: where an arrival goes, where a task whose slice ended goes, what a free CPU runs next
+	@abstractmethod
+	def arrive(self, task):
+		pass
+
+	@abstractmethod
+	def requeue(self, cpu, task):
+		pass
+
+	@abstractmethod
+	def pick(self, cpu):
+		pass
+
+	def balance(self):
+		pass
+
+
+class FairSimulator(Simulator):
+	"""
+	CFS/EEVDF-like: per-CPU runqueues ordered by vruntime, every task gets base_slice at a time.
+	New tasks go to an idle CPU or the least loaded one and start at that CPU's minimum vruntime
+	(zero lag), the running task keeps the CPU until its slice ends (RUN_TO_PARITY). A CPU going
+	idle pulls from the busiest runqueue and a periodic balancer evens out queue lengths.
+	"""
+
+	def __init__(self, cores, base_slice=0.003, balance_interval=0.004):
+		super().__init__(cores)
+		self.base_slice = base_slice
+		self.balance_interval = balance_interval
+		self.rq = [[] for _ in range(cores)]
+		self.min_vruntime = [0.0] * cores
+		self.balancing = False
+
+	def load(self, cpu):
+		return len(self.rq[cpu]) + (self.running[cpu] is not None)
+
+	def enqueue(self, cpu, task):
+		heapq.heappush(self.rq[cpu], (task.vruntime, next(self.seq), task))
+
+	def place(self, cpu, task):
+		# Zero lag: start at the smallest vruntime on the CPU, never behind its min_vruntime
+		present = []
+		if self.running[cpu] is not None:
+			present.append(self.running[cpu].vruntime)
+		if self.rq[cpu]:
+			present.append(self.rq[cpu][0][0])
+		task.vruntime = max(self.min_vruntime[cpu], min(present, default=0.0))
+
+	def arrive(self, task):
+		task.slice = self.base_slice
+		cpu = min(range(self.cores), key=self.load)
+		self.place(cpu, task)
+		if self.running[cpu] is None:
+			self.start(cpu, task)
+		else:
+			self.enqueue(cpu, task)
+
+		if not self.balancing:
+			self.balancing = True
+			self.schedule(self.now + self.balance_interval, BALANCE)
+
+	def requeue(self, cpu, task):
+		self.enqueue(cpu, task)
+
+	def pick(self, cpu):
+		if not self.rq[cpu]:
+			self.pull(cpu)
+		if self.rq[cpu]:
+			vruntime, _, task = heapq.heappop(self.rq[cpu])
+			self.min_vruntime[cpu] = max(self.min_vruntime[cpu], vruntime)
+			self.start(cpu, task)
+
+	def migrate(self, src, dst):
+		# Move the waiting task with the highest vruntime, renormalised to the destination
+		index = max(range(len(self.rq[src])), key=lambda i: self.rq[src][i][0])
+		_, _, task = self.rq[src].pop(index)
+		heapq.heapify(self.rq[src])
+		self.place(dst, task)
+		self.enqueue(dst, task)
+
+	def pull(self, cpu):
+		busiest = max(range(self.cores), key=lambda c: len(self.rq[c]))
+		if busiest != cpu and self.rq[busiest]:
+			self.migrate(busiest, cpu)
+
+	def balance(self):
+		while True:
+			busiest = max(range(self.cores), key=self.load)
+			idlest = min(range(self.cores), key=self.load)
+			if self.load(busiest) - self.load(idlest) < 2 or not self.rq[busiest]:
+				break
+			self.migrate(busiest, idlest)
+			if self.running[idlest] is None:
+				self.pick(idlest)
+
+		if self.in_system:
+			self.schedule(self.now + self.balance_interval, BALANCE)
+		else:
+			self.balancing = False
+
+
+class FifoSimulator(Simulator):
+	# SCHED_FIFO at one priority: tasks run to completion in arrival order on whichever CPU frees up
+	def __init__(self, cores):
+		super().__init__(cores)
+		self.queue = deque()
+
+	def arrive(self, task):
+		cpu = self.idle_cpu()
+		if cpu is None:
+			self.queue.append(task)
+		else:
+			self.start(cpu, task)
+
+	def requeue(self, cpu, task):
+		self.queue.appendleft(task)
+
+	def pick(self, cpu):
+		if self.queue:
+			self.start(cpu, self.queue.popleft())
+
+
+class ServerlessSimulator(Simulator):
+	"""
+	scx_serverless: one shared queue ordered by vtime. Tasks no longer than the calibrated duration
+	of fib rtc_threshold get an infinite slice and run to completion, longer ones get the default
+	slice (for fib arguments this is the scheduler's fib_slice_map). New tasks
+	start at the global vtime and go straight to an idle CPU if there is one, a requeued task's
+	vtime is lagged at most one default slice behind the global vtime.
+	"""
+
+	def __init__(self, cores, rtc_threshold=35, default_slice=0.02):
+		super().__init__(cores)
+		self.rtc_duration = arg_to_duration[rtc_threshold] / 1000
+		self.default_slice = default_slice
+		self.dsq = []
+		self.global_vtime = 0.0
+
+	def enqueue(self, task):
+		task.vruntime = max(task.vruntime, self.global_vtime - self.default_slice)
+		heapq.heappush(self.dsq, (task.vruntime, next(self.seq), task))
+
+	def arrive(self, task):
+		task.slice = INF if task.remaining <= self.rtc_duration else self.default_slice
+		task.vruntime = self.global_vtime
+		cpu = self.idle_cpu()
+		if cpu is None:
+			self.enqueue(task)
+		else:
+			self.start(cpu, task)
+
+	def requeue(self, cpu, task):
+		self.enqueue(task)
+
+	def pick(self, cpu):
+		if self.dsq:
+			vtime, _, task = heapq.heappop(self.dsq)
+			self.global_vtime = max(self.global_vtime, vtime)
+			self.start(cpu, task)
+
+
+def make_simulator(policy, cores, args):
+	if policy == "fair":
+		return FairSimulator(cores, args.slice, args.balance_interval)
+	if policy == "fifo":
+		return FifoSimulator(cores)
+	if policy == "serverless":
+		return ServerlessSimulator(cores, args.rtc_threshold, args.scx_slice)
+	raise ValueError(f"Unknown policy: {policy}")
+
+
+def trace_tasks(workload_file, iat_scale, payload="fib"):
+	arrival = 0.0
+	for iat, arg, i in read_workload(workload_file):
+		arrival += iat * iat_scale
+		if payload == "fib" and int(arg) not in arg_to_duration:
+			print(f"{Fore.RED}No calibrated duration for argument {arg}{Style.RESET_ALL}")
+			exit(-1)
+		yield Task(i + 1, arg, arrival, arg_duration_ms(arg, payload) / 1000)
+
+
+def main(args):
+	output_path = f"{os.getcwd()}/tmp/workload_times_{args.outputfile}.csv"
+	os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+	sim = make_simulator(args.policy, args.cores, args)
+	latencies = []
+	makespan = 0.0
+
+	with open(output_path, "w", newline="") as f:
+		writer = csv.writer(f)
+		writer.writerow(COLUMNS)
+
+		def emit(task, exit_time):
+			nonlocal makespan
+			latency = task.first_run - task.arrival
+			writer.writerow([task.pid, task.arg, task.arrival, latency, exit_time, task.migrations,
+							 task.arrival, exit_time, exit_time - task.arrival])
+			latencies.append(latency)
+			makespan = max(makespan, exit_time)
+
+		print(f"{Fore.GREEN}Simulating {args.policy} on {args.cores} cores, IAT scale {args.iat_scale:g}{Style.RESET_ALL}")
+		sim.run(trace_tasks(args.workload_file, args.iat_scale, args.payload), emit)
+
+	if not latencies:
+		print(f"{Fore.RED}Empty workload{Style.RESET_ALL}")
+		return
+
+	latencies = np.array(latencies) * 1e3
+	print(f"{Fore.CYAN}{len(latencies)} tasks, makespan {makespan:.2f} s, startup latency "
+		  f"mean {latencies.mean():.2f} ms, p50 {np.percentile(latencies, 50):.2f} ms, "
+		  f"p99 {np.percentile(latencies, 99):.2f} ms, max {latencies.max():.2f} ms{Style.RESET_ALL}")
+	print(f"{Fore.CYAN}Workload times written to: workload_times_{args.outputfile}.csv{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Simulate a workload replay under a scheduling policy")
+	parser.add_argument("--outputfile", type=str, required=True, help="Name of the tmp/workload_times_<name>.csv output")
+	parser.add_argument("--policy", type=str, choices=POLICIES, default="fair",
+						help="fair: CFS/EEVDF-like, fifo: SCHED_FIFO run to completion, serverless: scx_serverless")
+	parser.add_argument("--cores", type=int, default=max(1, os.cpu_count() - 1), help="Cores the functions run on")
+	parser.add_argument("--iat_scale", type=float, default=1.0, help="Factor applied to every IAT (<1 raises the load)")
+	parser.add_argument("--slice", type=float, default=0.003, help="Base slice (s) of the fair policy")
+	parser.add_argument("--balance_interval", type=float, default=0.004, help="Load balancing period (s) of the fair policy")
+	parser.add_argument("--rtc_threshold", type=int, default=35, help="Largest fib argument scx_serverless runs to completion")
+	parser.add_argument("--scx_slice", type=float, default=0.02, help="Default slice (s) of scx_serverless")
+	parser.add_argument("--payload", type=str, choices=("fib", "burn"), default="fib",
+						help="fib: arguments are fib N's, burn: arguments are milliseconds (gen_workload.py --unit ms)")
+	parser.add_argument("--workload_file", type=str, default=workload_file, help="Workload trace to simulate")
+	main(parser.parse_args())
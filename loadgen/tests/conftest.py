@@ -0,0 +1,8 @@
+import os
+import sys
+import __main__
+
+loadgen_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, loadgen_dir)
+# utils.exec_utils resolves log/ and the calibration table from the entry script
+__main__.__file__ = os.path.join(loadgen_dir, "exec_workload.py")
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from utils.cgroups import CgroupPlacement, size_class
+
+
+class FakeProc:
+	def __init__(self, pid):
+		self.pid = pid
+
+
+def test_size_class():
+	assert size_class("25") == "fib_25"
+	assert size_class("3", "burn") == "ms_4"
+	assert size_class("4", "burn") == "ms_4"
+	assert size_class("0.5", "burn") == "ms_1"
+
+
+def test_wrap_places_tasks(tmp_path):
+	root = tmp_path / "functions"
+	cgroups = CgroupPlacement(str(root), "fib")
+	assert (root / "cgroup.subtree_control").read_text() == "+cpu"
+
+	pids = iter(range(1000, 1010))
+	spawn = cgroups.wrap(lambda arg: FakeProc(next(pids)))
+	for arg in ["20", "25", "20"]:
+		spawn(arg)
+
+	assert (root / "fib_20" / "cgroup.procs").read_text() == "1000\n1002\n"
+	assert (root / "fib_25" / "cgroup.procs").read_text() == "1001\n"
+	assert cgroups.errors == 0
+
+
+def test_samples_fake_tree(tmp_path):
+	root = tmp_path / "functions"
+	cgroups = CgroupPlacement(str(root), "fib")
+	cgroups.place(1000, "20")
+	cgroups.place(1001, "25")
+	cgroups.place(1002, "30")
+
+	(root / "fib_20" / "cpu.stat").write_text("usage_usec 500\nuser_usec 400\nsystem_usec 100\n"
+											   "nr_throttled 2\nthrottled_usec 30\n")
+	(root / "fib_20" / "cpu.pressure").write_text("some avg10=0.00 avg60=0.00 avg300=0.00 total=70\n"
+												   "full avg10=0.00 avg60=0.00 avg300=0.00 total=9\n")
+	# No cpu.pressure: counters kept, PSI empty. fib_30 has no cpu.stat and is skipped
+	(root / "fib_25" / "cpu.stat").write_text("usage_usec 50\nuser_usec 50\nsystem_usec 0\n")
+
+	outputfile = str(tmp_path / "run")
+	cgroups.stop(outputfile)
+	df = pd.read_csv(f"{outputfile}_cgroups.csv").set_index("class")
+
+	assert sorted(df.index) == ["fib_20", "fib_25"]
+	assert df.loc["fib_20", "usage_usec"] == 500
+	assert df.loc["fib_20", "throttled_usec"] == 30
+	assert df.loc["fib_20", "some_total"] == 70
+	assert df.loc["fib_20", "full_total"] == 9
+	assert df.loc["fib_25", "usage_usec"] == 50
+	assert pd.isna(df.loc["fib_25", "nr_throttled"])
+	assert pd.isna(df.loc["fib_25", "some_total"])
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from utils.columnar import ColumnarResultStream, read_timings
+from utils.exec_utils import timing_columns
+
+
+def classed_result(pid, arg, name):
+	# (output, arg, request_time, return_time, extra) as the reaper stores it for a --classes run
+	extra = {'lateness': 1e-6, 'class': name, 'queue_wait': 2e-5, 'spawn_cost': 1e-3,
+			 'utime': 0.01, 'stime': 0.0, 'nvcsw': 1, 'nivcsw': 2}
+	return (f"{pid} 1", arg, 100.0 + pid, 100.5 + pid, extra)
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_classes_columnar(tmp_path, fmt):
+	outputfile = str(tmp_path / "run")
+	columns = timing_columns(classes=True)
+	results = ColumnarResultStream(outputfile, columns, fmt, "fib", batch_size=2)
+	names = ["short", "batch", "short", "short", "batch"]
+	for index, name in enumerate(names):
+		results[index] = classed_result(1000 + index, "20", name)
+	results.close()
+
+	df = read_timings(outputfile)
+	assert list(df.columns) == columns
+	assert list(df["class"].astype(str)) == names
+	assert list(df["pid"]) == [1000 + index for index in range(len(names))]
+
+
+def test_unknown_column_raises(tmp_path):
+	results = ColumnarResultStream(str(tmp_path / "run"), timing_columns(), "arrow", "fib")
+	with pytest.raises(ValueError):
+		results[0] = classed_result(1000, "20", "short")
+	results.close()
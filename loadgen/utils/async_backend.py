@@ -0,0 +1,142 @@
+import asyncio
+import os
+import sys
+import time
+from utils.spawn import chain_command, direct_spawner, read_output, rusage_fields
+from utils.dispatch import wait_for_start
+from colorama import Fore, Style
+
+
+async def run_task(cmd, stdout, cgroups, metrics, arg, index, request_time, extra, results):
+	perf_counter = time.perf_counter
+
+	try:
+		spawn_start = perf_counter()
+		proc = await asyncio.create_subprocess_exec(
+			*cmd, arg,
+			stdout=asyncio.subprocess.PIPE if stdout is None else stdout,
+			stderr=asyncio.subprocess.DEVNULL
+		)
+		if cgroups is not None:
+			cgroups.place(proc.pid, arg)
+		extra['spawn_cost'] = perf_counter() - spawn_start
+
+		# Resolved from the pidfd watcher callback, before stdout is touched. The watcher reaps
+		# the child itself, so this path has no rusage columns
+		status = await proc.wait()
+		return_time = time.time()
+
+		output = (await proc.stdout.read()).decode().strip() if proc.stdout is not None else str(proc.pid)
+		if status != 0:
+			print(f"Process {arg} failed with {status}")
+
+		results[index] = (output, arg, request_time, return_time, extra)
+		if metrics is not None:
+			metrics.complete(request_time, return_time)
+
+	except Exception as e:
+		print(f"Task Error: {e}")
+
+
+async def run_task_direct(spawn, metrics, arg, index, request_time, extra, results):
+	"""
+	create_subprocess_exec yields to the loop before the pid could be given its attributes, so the
+	direct mode spawns synchronously and waits on the child's pidfd itself, like the watcher does.
+	"""
+	loop = asyncio.get_running_loop()
+	perf_counter = time.perf_counter
+
+	try:
+		spawn_start = perf_counter()
+		proc = spawn(arg)
+		extra['spawn_cost'] = perf_counter() - spawn_start
+
+		pidfd = os.pidfd_open(proc.pid)
+		exited = loop.create_future()
+		loop.add_reader(pidfd, exited.set_result, None)
+		try:
+			await exited
+		finally:
+			loop.remove_reader(pidfd)
+			os.close(pidfd)
+		return_time = time.time()
+
+		_, status, rusage = os.wait4(proc.pid, 0)
+		extra.update(rusage_fields(rusage))
+		output = read_output(proc)
+		if status != 0:
+			print(f"Process {arg} failed with {os.waitstatus_to_exitcode(status)}")
+
+		results[index] = (output, arg, request_time, return_time, extra)
+		if metrics is not None:
+			metrics.complete(request_time, return_time)
+
+	except Exception as e:
+		print(f"Task Error: {e}")
+
+
+async def dispatch(workload, results, start_task, spin_window, start_at=None, telemetry=None, metrics=None):
+	"""
+	Same absolute-deadline schedule as the deadline dispatcher, on the event loop's monotonic
+	clock. Spawns and completions of earlier tasks run while the dispatcher awaits its next
+	deadline, only the final spin_window is spent spinning.
+	"""
+	loop = asyncio.get_running_loop()
+	monotonic = loop.time
+	tasks = set()
+	if metrics is not None:
+		metrics.gauges["in_flight"] = lambda: len(tasks)
+
+	# The loop clock is time.monotonic, so the barrier instant is valid on it
+	start_simulation, start = wait_for_start(start_at)
+	deadline = start
+
+	for IAT, arg, index in workload:
+		deadline += IAT
+
+		remaining = deadline - monotonic()
+		if remaining > spin_window:
+			await asyncio.sleep(remaining - spin_window)
+		while monotonic() < deadline:
+			pass
+
+		request_time = start_simulation + (deadline - start)
+		extra = {'lateness': monotonic() - deadline}
+		if telemetry is not None:
+			telemetry.record(arg, request_time, extra['lateness'])
+		if metrics is not None:
+			metrics.dispatch()
+
+		task = loop.create_task(start_task(arg, index, request_time, extra, results))
+		tasks.add(task)
+		task.add_done_callback(tasks.discard)
+
+	print(f"{Fore.GREEN}Main loop finished dispatching after {time.time()-start_simulation:.2f}s{Style.RESET_ALL}")
+
+	while tasks:
+		await asyncio.gather(*tasks)
+
+	return start_simulation
+
+
+def run(workload, results, cpus, fifo=False, sched_ext=False, spawn_mode="chain", spin_window=0.0002, stdout=None,
+		start_at=None, telemetry=None, payload_args=(), cgroups=None, metrics=None):
+	"""
+	Single-threaded backend: dispatch, spawns and completions all run on one asyncio event loop.
+	stdout: fd shared by all payloads, None for a pipe per task.
+	Returns the wall-clock start of the dispatch.
+	"""
+	if spawn_mode == "direct":
+		spawn = direct_spawner(cpus, fifo, sched_ext, stdout=stdout, payload_args=payload_args)
+		if cgroups is not None:
+			spawn = cgroups.wrap(spawn)
+		start_task = lambda *task: run_task_direct(spawn, metrics, *task)
+	else:
+		cmd = chain_command(cpus, fifo, sched_ext, payload_args)
+		start_task = lambda *task: run_task(cmd, stdout, cgroups, metrics, *task)
+
+	# 3.12+ already picks the pidfd watcher on Linux and deprecates setting it
+	if sys.version_info < (3, 12):
+		asyncio.set_child_watcher(asyncio.PidfdChildWatcher())
+
+	return asyncio.run(dispatch(workload, results, start_task, spin_window, start_at, telemetry, metrics))
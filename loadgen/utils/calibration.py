@@ -0,0 +1,49 @@
+import os
+import json
+import socket
+
+PROFILE_VERSION = 1
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+profile_dir = os.path.join(script_dir, "log/calibration")
+
+# Calibration of the original testbed, used on hosts that have no profile yet
+DEFAULT_DUR_LIST = [7, 8, 9, 10, 12, 14, 17, 21, 27, 39, 56, 85, 131, 205, 325, 520, 838, 1347, 2175, 3512, 5673, 9172, 14835]
+DEFAULT_FIB = [24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 43, 44, 45, 46]
+
+
+def profile_path(host=None):
+	return os.path.join(profile_dir, f"profile_{host or socket.gethostname()}.json")
+
+
+def load_profile(host=None):
+	"""
+	The calibration profile written by calibrate.py for this host (LOADGEN_CALIBRATION points
+	to another file), None when there is none.
+	"""
+	path = os.environ.get("LOADGEN_CALIBRATION") or profile_path(host)
+	try:
+		with open(path, "r") as f:
+			profile = json.load(f)
+	except FileNotFoundError:
+		return None
+
+	if profile.get("version") != PROFILE_VERSION:
+		raise ValueError(f"{path}: calibration profile version {profile.get('version')}, expected {PROFILE_VERSION}")
+	return profile
+
+
+def load_table(host=None):
+	# (fib, dur_list): fib arguments and their durations in ms, from the profile or the defaults
+	profile = load_profile(host)
+	if profile is None:
+		return list(DEFAULT_FIB), list(DEFAULT_DUR_LIST)
+	return profile["fib"], profile["dur_ms"]
+
+
+def save_profile(profile, host=None):
+	os.makedirs(profile_dir, exist_ok=True)
+	path = profile_path(host)
+	with open(path, "w") as f:
+		json.dump({"version": PROFILE_VERSION, **profile}, f, indent=1)
+	return path
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+import pandas as pd
+from colorama import Fore, Style
+
+default_cgroup_root = "/sys/fs/cgroup/loadgen/functions"
+
+SAMPLE_COLUMNS = ["timestamp", "class", "usage_usec", "user_usec", "system_usec", "nr_throttled", "throttled_usec",
+				  "some_total", "full_total"]
+
+
+def size_class(arg, payload="fib"):
+	# fib arguments are their own class, burn milliseconds are bucketed by the next power of two
+	if payload == "burn":
+		ms = max(1, int(float(arg)))
+		return f"ms_{1 << (ms - 1).bit_length()}"
+	return f"fib_{arg}"
+
+
+def read_keyed(path):
+	# cpu.stat: "key value" lines
+	values = {}
+	with open(path, "r") as f:
+		for line in f:
+			key, _, value = line.partition(" ")
+			values[key] = int(value)
+	return values
+
+
+def read_pressure_totals(path):
+	# cpu.pressure: "some avg10=0.00 avg60=0.00 avg300=0.00 total=123" (+ "full ..." line), totals in usec
+	totals = {}
+	with open(path, "r") as f:
+		for line in f:
+			kind, *fields = line.split()
+			for field in fields:
+				if field.startswith("total="):
+					totals[kind] = int(field[len("total="):])
+	return totals
+
+
+class CgroupPlacement:
+	"""
+	Puts every invocation into a cgroup v2 child of `root` named after its size class and samples
+	cpu.stat and cpu.pressure of every class cgroup each `interval`. The counters are kept as the
+	cumulative values the kernel reports, differences between samples give rates.
+	A task is moved by writing its pid to cgroup.procs right after the spawn, so the first
+	instructions of a chain-spawned task (the wrapper execs) still run in the orchestrator's cgroup.
+	Files that are missing (a fake cgroupfs tree) are skipped by the sampler.
+	"""
+
+	def __init__(self, root=default_cgroup_root, payload="fib", interval=0.1):
+		self.root = root
+		self.payload = payload
+		self.interval = interval
+		self.procs_fds = {}
+		self.lock = threading.Lock()
+		self.samples = []
+		self.running = False
+		self.sampler = None
+		self.errors = 0
+
+		os.makedirs(root, exist_ok=True)
+		try:
+			# Needed for the throttling counters in cpu.stat, already enabled on most setups
+			with open(os.path.join(root, "cgroup.subtree_control"), "w") as f:
+				f.write("+cpu")
+		except OSError:
+			pass
+
+	def procs_fd(self, cls):
+		with self.lock:
+			fd = self.procs_fds.get(cls)
+			if fd is None:
+				path = os.path.join(self.root, cls)
+				os.makedirs(path, exist_ok=True)
+				fd = os.open(os.path.join(path, "cgroup.procs"), os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC, 0o644)
+				self.procs_fds[cls] = fd
+			return fd
+
+	def place(self, pid, arg):
+		try:
+			os.write(self.procs_fd(size_class(arg, self.payload)), f"{pid}\n".encode())
+		except OSError:
+			# The task may already have exited, it is then simply not accounted to its class
+			self.errors += 1
+
+	def wrap(self, spawn):
+		# spawn(arg) that also places the new task in its class cgroup
+		def spawn_into(arg):
+			proc = spawn(arg)
+			self.place(proc.pid, arg)
+			return proc
+		return spawn_into
+
+	def start(self):
+		self.running = True
+		self.sampler = threading.Thread(target=self._sample_loop, daemon=True)
+		self.sampler.start()
+
+	def sample(self):
+		timestamp = time.time()
+		with self.lock:
+			classes = list(self.procs_fds)
+
+		for cls in classes:
+			path = os.path.join(self.root, cls)
+			try:
+				stat = read_keyed(os.path.join(path, "cpu.stat"))
+			except (OSError, ValueError):
+				continue
+			try:
+				pressure = read_pressure_totals(os.path.join(path, "cpu.pressure"))
+			except (OSError, ValueError):
+				pressure = {}
+
+			self.samples.append((timestamp, cls, stat.get("usage_usec"), stat.get("user_usec"), stat.get("system_usec"),
+								 stat.get("nr_throttled"), stat.get("throttled_usec"),
+								 pressure.get("some"), pressure.get("full")))
+
+	def _sample_loop(self):
+		while self.running:
+			self.sample()
+			time.sleep(self.interval)
+
+	def stop(self, outputfile):
+		self.running = False
+		if self.sampler:
+			self.sampler.join()
+		# Final sample after every task has exited
+		self.sample()
+
+		with self.lock:
+			for cls, fd in self.procs_fds.items():
+				os.close(fd)
+				try:
+					os.rmdir(os.path.join(self.root, cls))
+				except OSError:
+					pass
+			classes = len(self.procs_fds)
+			self.procs_fds = {}
+
+		if self.errors:
+			print(f"{Fore.YELLOW}{self.errors} tasks exited before they could be placed in their cgroup{Style.RESET_ALL}")
+		if not self.samples:
+			print(f"{Fore.YELLOW}No cgroup statistics collected under {self.root}{Style.RESET_ALL}")
+			return
+
+		df = pd.DataFrame(self.samples, columns=SAMPLE_COLUMNS)
+		df.to_csv(f"{outputfile}_cgroups.csv", index=False)
+		print(f"{Fore.CYAN}{classes} class cgroups sampled {df['timestamp'].nunique()} times. "
+			  f"Saved in {outputfile}_cgroups.csv{Style.RESET_ALL}")
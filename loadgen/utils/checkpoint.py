@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+from colorama import Fore, Style
+from utils.exec_utils import timing_row
+
+
+def result_from_row(row):
+	# Journal row back to the (output, arg, request_time, return_time, extra) tuple of a result
+	extra = dict(row)
+	index = extra.pop('index')
+	pid, arg = extra.pop('pid'), extra.pop('arg')
+	request_time, return_time = extra.pop('request_time'), extra.pop('return_time')
+	extra.pop('duration', None)
+	return index, (str(pid), arg, request_time, return_time, extra)
+
+
+class JournaledResults:
+	# Tags every result with its segment and journals it on the way to `results`
+	def __init__(self, checkpoint, results):
+		self.checkpoint = checkpoint
+		self.results = results
+
+	def __setitem__(self, index, task_result):
+		task_result[4]['segment'] = self.checkpoint.segment
+		self.results[index] = task_result
+		self.checkpoint.completed(index, task_result)
+
+
+class Checkpoint:
+	# Results go to _journal.jsonl as they complete, every `interval` _checkpoint.json gets the dispatch
+	# cursor and the outstanding tasks. A resume keeps the results before the cursor and records the gap
+
+	def __init__(self, outputfile, interval=10.0, resume=False):
+		self.outputfile = outputfile
+		self.state_path = f"{outputfile}_checkpoint.json"
+		self.journal_path = f"{outputfile}_journal.jsonl"
+		self.interval = interval
+
+		self.cursor = 0
+		self.segment = 0
+		self.in_flight = {}
+		self.pids = lambda: {}
+		self.previous = []
+		self.gaps = []
+		if resume:
+			self._load()
+
+		self.lock = threading.Lock()
+		self.journal = open(self.journal_path, "a")
+		self.running = False
+		self.thread = None
+
+	def _load(self):
+		if not os.path.exists(self.state_path):
+			print(f"{Fore.RED}No checkpoint to resume from at {self.state_path}{Style.RESET_ALL}")
+			exit(-1)
+		with open(self.state_path, "r") as f:
+			state = json.load(f)
+
+		self.cursor = state['cursor']
+		self.segment = state['segment'] + 1
+		done = set()
+		rows = []
+		if os.path.exists(self.journal_path):
+			with open(self.journal_path, "r") as f:
+				for line in f:
+					try:
+						row = json.loads(line)
+					except ValueError:
+						# Torn last line of the interrupted run
+						break
+					# Arrivals after the cursor are dispatched again
+					if row['index'] < self.cursor:
+						rows.append(row)
+						done.add(row['index'])
+
+		# The journal keeps only what is carried over, so re-runs do not leave duplicates
+		tmp = f"{self.journal_path}.tmp"
+		with open(tmp, "w") as f:
+			for row in rows:
+				f.write(json.dumps(row) + "\n")
+		os.replace(tmp, self.journal_path)
+		self.previous = [result_from_row(row) for row in rows]
+
+		lost = {int(index): pid for index, pid in state['in_flight'].items() if int(index) not in done}
+		self.gaps = state['gaps'] + [{
+			'segment': self.segment,
+			'checkpoint_time': state['time'],
+			'resume_time': time.time(),
+			'cursor': self.cursor,
+			'lost': sorted(lost.items()),
+		}]
+		print(f"{Fore.YELLOW}Resuming at arrival {self.cursor} (segment {self.segment}): {len(rows)} results kept, "
+			  f"{len(lost)} tasks lost{Style.RESET_ALL}")
+
+	def remaining(self, workload):
+		# Arrivals from the cursor on, the first one fires right at the start of the segment
+		trace_time = 0.0
+		first = True
+		for iat, arg, index in workload:
+			trace_time += iat
+			if index < self.cursor:
+				continue
+			if first and self.segment:
+				self.gaps[-1]['trace_time'] = trace_time
+				iat = 0.0
+			first = False
+			yield iat, arg, index
+
+	def restore(self, results):
+		for index, task_result in self.previous:
+			results[index] = task_result
+		self.previous = []
+
+	def wrap(self, results):
+		return JournaledResults(self, results)
+
+	def dispatched(self, index):
+		# Dispatching thread only, arrivals are dispatched in index order
+		self.in_flight[index] = None
+		self.cursor = index + 1
+
+	def completed(self, index, task_result):
+		self.in_flight.pop(index, None)
+		row = {'index': index, **timing_row(task_result)}
+		with self.lock:
+			self.journal.write(json.dumps(row) + "\n")
+
+	def start(self):
+		self.running = True
+		self.thread = threading.Thread(target=self._checkpoint_loop, daemon=True)
+		self.thread.start()
+
+	def _checkpoint_loop(self):
+		while self.running:
+			time.sleep(self.interval)
+			self.save()
+
+	def save(self):
+		# Cursor first: a task dispatched meanwhile is then past the cursor and run again on resume
+		cursor = self.cursor
+		in_flight = {index: None for index in dict(self.in_flight) if index < cursor}
+		in_flight.update((index, pid) for index, pid in self.pids().items() if index in in_flight)
+
+		with self.lock:
+			self.journal.flush()
+			os.fsync(self.journal.fileno())
+
+		state = {
+			'cursor': cursor,
+			'segment': self.segment,
+			'time': time.time(),
+			'in_flight': in_flight,
+			'gaps': self.gaps,
+		}
+		tmp = f"{self.state_path}.tmp"
+		with open(tmp, "w") as f:
+			json.dump(state, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, self.state_path)
+
+	def close(self):
+		# Final checkpoint: every arrival dispatched and journaled, a resume only rewrites the outputs
+		self.running = False
+		if self.thread:
+			self.thread.join()
+		self.save()
+		self.journal.close()
+
+		if not self.gaps:
+			return
+		with open(f"{self.outputfile}_gaps.txt", "w") as f:
+			for gap in self.gaps:
+				f.write(f"segment {gap['segment']}: resumed at arrival {gap['cursor']} "
+						f"(trace time {gap.get('trace_time', 0.0):.3f} s), "
+						f"{gap['resume_time'] - gap['checkpoint_time']:.2f} s after the last checkpoint\n")
+				for index, pid in gap['lost']:
+					f.write(f"  lost arrival {index} (pid {pid if pid is not None else 'not spawned'})\n")
+		print(f"{Fore.CYAN}{len(self.gaps)} resume gaps recorded in {self.outputfile}_gaps.txt{Style.RESET_ALL}")
+
+	def finish(self):
+		# Only once the outputs hold every segment, until then the journal is the only copy of the results
+		os.remove(self.journal_path)
+		os.remove(self.state_path)
@@ -0,0 +1,120 @@
+import heapq
+import json
+import os
+import statistics
+from array import array
+from colorama import Fore, Style
+from utils.exec_utils import read_workload
+from utils.spawn import SCHED_POLICIES
+
+
+class WorkloadClass:
+	# One workload stream of a multi-class replay and the scheduling attributes of its tasks, nice is absolute
+	__slots__ = ("name", "workload_file", "nice", "policy", "cpus")
+
+	def __init__(self, name, workload_file, nice=0, policy="other", cpus=None):
+		self.name = name
+		self.workload_file = workload_file
+		self.nice = nice
+		self.policy = policy
+		self.cpus = cpus
+
+
+def parse_cpus(cpus):
+	# "2-3,6" or [2, 3, 6]
+	if isinstance(cpus, list):
+		return {int(c) for c in cpus}
+	result = set()
+	for part in str(cpus).split(","):
+		first, _, last = part.partition("-")
+		result.update(range(int(first), int(last or first) + 1))
+	return result
+
+
+def load_classes(path, default_cpus):
+	"""
+	Class file: a JSON list of {"name", "workload_file", "nice", "policy", "cpus"}, e.g.
+	[{"name": "short", "workload_file": "dataset/short.txt", "nice": 0, "policy": "fifo", "cpus": "1-3"},
+	 {"name": "batch", "workload_file": "dataset/batch.txt", "nice": 19, "policy": "batch"}]
+	Only name and workload_file are required, relative workload paths are relative to the class file.
+	nice is the absolute niceness of the tasks (default 0, what single-class payloads get), not an
+	increment to the generator's -15. Tasks of a class without cpus run on the workload CPUs.
+	"""
+	with open(path, "r") as f:
+		entries = json.load(f)
+
+	classes = []
+	for entry in entries:
+		policy = entry.get("policy", "other")
+		if policy not in SCHED_POLICIES:
+			raise ValueError(f"Class {entry['name']}: unknown policy {policy}, expected one of {SCHED_POLICIES}")
+		classes.append(WorkloadClass(
+			entry["name"],
+			os.path.join(os.path.dirname(os.path.abspath(path)), entry["workload_file"]),
+			entry.get("nice", 0),
+			policy,
+			parse_cpus(entry["cpus"]) if "cpus" in entry else set(default_cpus),
+		))
+	if len({c.name for c in classes}) != len(classes):
+		raise ValueError("Class names must be unique")
+	return classes
+
+
+class ClassedWorkload:
+	"""
+	The arrivals of every class merged by absolute arrival time into one (iat, arg, index) stream,
+	indexes numbered in merged order. The class of each arrival is recorded as it is yielded, so
+	name_of(index) is valid for every arrival the dispatcher has read. Files are read lazily.
+	"""
+
+	def __init__(self, classes):
+		self.classes = classes
+		self.class_of = array('B')
+
+	def _arrivals(self, k):
+		arrival = 0.0
+		for iat, arg, _ in read_workload(self.classes[k].workload_file):
+			arrival += iat
+			yield arrival, k, arg
+
+	def __iter__(self):
+		self.class_of = array('B')
+		previous = 0.0
+		merged = heapq.merge(*(self._arrivals(k) for k in range(len(self.classes))))
+		for index, (arrival, k, arg) in enumerate(merged):
+			self.class_of.append(k)
+			yield arrival - previous, arg, index
+			previous = arrival
+
+	def name_of(self, index):
+		return self.classes[self.class_of[index]].name
+
+
+class ClassTally:
+	# Response time (return - request) of every task per class, results are passed on to `results`
+	def __init__(self, results, classes):
+		self.results = results
+		self.durations = {c.name: array('d') for c in classes}
+
+	def __setitem__(self, index, task_result):
+		_, _, request_time, return_time, extra = task_result
+		self.durations[extra['class']].append(return_time - request_time)
+		self.results[index] = task_result
+
+
+def log_class_summary(durations, classes, outputfile):
+	# Response time per class (ClassTally.durations), the isolation the scheduler gives the short class
+	lines = []
+	for c in classes:
+		d = sorted(durations[c.name])
+		if not d:
+			lines.append(f"{c.name}: no tasks")
+			continue
+		lines.append(f"{c.name} ({c.policy}, nice {c.nice}, CPUs {','.join(str(cpu) for cpu in sorted(c.cpus))}): "
+					 f"{len(d)} tasks, response mean {statistics.fmean(d) * 1e3:.1f} ms, "
+					 f"p50 {d[len(d) // 2] * 1e3:.1f} ms, p99 {d[min(len(d) - 1, len(d) * 99 // 100)] * 1e3:.1f} ms")
+
+	with open(f"{outputfile}_classes.txt", "w") as f:
+		f.write("\n".join(lines) + "\n")
+	for line in lines:
+		print(f"{Fore.CYAN}{line}{Style.RESET_ALL}")
@@ -0,0 +1,113 @@
+import os
+import pandas as pd
+from colorama import Fore, Style
+from utils.exec_utils import timing_row
+
+RESULT_FORMATS = ("csv", "arrow", "parquet")
+TIMINGS_EXTENSIONS = {"csv": "csv", "arrow": "arrow", "parquet": "parquet"}
+
+# Types of the per-task columns, extras not listed here are float64
+INT_COLUMNS = {"pid": "int32", "warm": "uint8", "nvcsw": "int64", "nivcsw": "int64", "timeslices": "int64",
+			   "segment": "int32"}
+
+
+def column_type(pa, name, payload):
+	if name == "arg":
+		# fib N's fit a byte, burn arguments are milliseconds
+		return pa.uint8() if payload == "fib" else pa.float64()
+	if name == "class":
+		# Workload class name (--classes). Not dictionary encoded, an IPC file cannot change a dictionary between batches
+		return pa.string()
+	return getattr(pa, INT_COLUMNS.get(name, "float64"))()
+
+
+class ColumnarResultStream:
+	# Appends the timing rows to _timings.arrow or .parquet in batches of `batch_size`, schema from timing_columns
+
+	def __init__(self, outputfile, columns, fmt="arrow", payload="fib", timings=True, batch_size=8192):
+		import pyarrow as pa
+		self.pa = pa
+		self.outputfile = outputfile
+		self.fmt = fmt
+		self.payload = payload
+		self.batch_size = batch_size
+		self.path = f"{outputfile}_timings.{TIMINGS_EXTENSIONS[fmt]}"
+		self.timings = timings
+
+		self.count = 0
+		self.pids_file = open(f"{outputfile}_pids.txt", "w")
+		self.rows = []
+		self.names = set(columns)
+		self.schema = pa.schema([(name, column_type(pa, name, payload)) for name in columns])
+		self.writer = None
+
+	def __setitem__(self, index, task_result):
+		row = timing_row(task_result)
+		self.pids_file.write(f"{row['pid']} {row['arg']}\n")
+		self.count += 1
+
+		if not self.timings:
+			return
+		if not self.names.issuperset(row):
+			raise ValueError(f"Columns not in the {self.fmt} schema: {sorted(set(row) - self.names)}")
+		self.rows.append(row)
+		if len(self.rows) >= self.batch_size:
+			self.flush()
+
+	def _open(self):
+		if self.fmt == "parquet":
+			import pyarrow.parquet as pq
+			self.writer = pq.ParquetWriter(self.path, self.schema)
+		else:
+			self.writer = self.pa.ipc.new_file(self.path, self.schema)
+
+	def flush(self):
+		if not self.rows:
+			return
+		if self.writer is None:
+			self._open()
+
+		columns = []
+		for field in self.schema:
+			values = [row.get(field.name) for row in self.rows]
+			if field.name in ("pid", "arg"):
+				values = [None if value is None else (int(value) if field.type != self.pa.float64() else float(value))
+						  for value in values]
+			columns.append(self.pa.array(values, type=field.type))
+
+		self.writer.write_batch(self.pa.record_batch(columns, schema=self.schema))
+		self.rows = []
+
+	def close(self):
+		self.flush()
+		if self.writer is not None:
+			self.writer.close()
+		self.pids_file.close()
+		print(f"{Fore.CYAN}Run {self.count} tasks. Pids saved in {self.outputfile}_pids.txt"
+			  f"{f', timings in {self.path}' if self.writer is not None else ''}{Style.RESET_ALL}")
+
+def timings_path(outputfile):
+	# The _timings file a run left behind, whatever its format
+	for fmt in RESULT_FORMATS:
+		path = f"{outputfile}_timings.{TIMINGS_EXTENSIONS[fmt]}"
+		if os.path.exists(path):
+			return path
+	return None
+
+
+def read_timings(outputfile):
+	# _timings.csv, .arrow (memory mapped) or .parquet as a DataFrame
+	path = timings_path(outputfile)
+	if path is None:
+		raise FileNotFoundError(f"No timings for {outputfile}")
+
+	if path.endswith(".csv"):
+		return pd.read_csv(path)
+
+	import pyarrow as pa
+	if path.endswith(".arrow"):
+		with pa.memory_map(path, "r") as source:
+			return pa.ipc.open_file(source).read_all().to_pandas()
+
+	import pyarrow.parquet as pq
+	return pq.read_table(path).to_pandas()
@@ -1,55 +1,386 @@
-import psutil
-import threading
+import os
+import struct
 import time
+import tempfile
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
 import pandas as pd
+from colorama import Fore, Style
 
-monitor_running = False
-monitor_thread = None
-cores_to_monitor = []
-cpu_data = []
+# Header slots of the shared segment, in front of the sample ring
+WRITTEN, STOP, SAMPLE_NS, LATE, SAMPLER_CPU_NS, HEADER_SLOTS = range(6)
 
+monitor_process = None
+monitor_shm = None
+monitor_drain = None
+monitor_interval = 0.2
 
-def start_cpu_monitoring(interval=0.2):
-	global monitor_thread
-	monitor_thread = threading.Thread(
-		target=monitor_cpu_usage, args=[interval], daemon=True)
-	monitor_thread.start()
 
+def stat_cpu_ids():
+	# CPUs with a cpuN line in /proc/stat: offline CPUs have none, so ids can go past the count
+	with open("/proc/stat", "rb") as f:
+		return [int(line.split()[0][3:]) for line in f if line.startswith(b"cpu") and line[3:4].isdigit()]
 
-def stop_cpu_monitoring(outputfile, start_time, end_time):
-	global monitor_running, cpu_data
-	monitor_running = False
-	if not monitor_thread:
-		return
-	monitor_thread.join(timeout=2.0)
 
-	# Filter the data to include only the time range
-	cpu_data = [(timestamp, per_cpu) for timestamp,
-				per_cpu in cpu_data if start_time <= timestamp <= end_time]
+# Per-CPU columns follow the CPUs online at startup, cpu_column maps a CPU id to its column
+cpu_ids = stat_cpu_ids()
+cpu_count = len(cpu_ids)
+cpu_column = {cpu: i for i, cpu in enumerate(cpu_ids)}
+
+# Row: timestamp, utilization % per CPU, then the SCHED_COLUMNS, then per CPU the SCHED_CPU_COLUMNS
+SCHED_COLUMNS = ["procs_running", "procs_blocked", "psi_some", "psi_full"]
+SCHED_CPU_COLUMNS = ["run", "wait", "slices"]
+PSI_LINES = {b"some": 0, b"full": 1}
+row_columns = 1 + cpu_count + len(SCHED_COLUMNS) + len(SCHED_CPU_COLUMNS) * cpu_count
+
+CPU_LOG_FORMATS = ("csv", "bin")
+# _cpu_util.bin: magic, CPU count, interval (s), wall time of the first sample, row count, padded
+# to 64 bytes, the uint32 CPU id of every column, then a float32 row-major matrix of
+# (seconds since the first sample, util % per CPU). LGCPUUT1 logs have no ids, their CPUs are 0..count-1
+BIN_MAGIC = b"LGCPUUT2"
+BIN_MAGIC_V1 = b"LGCPUUT1"
+BIN_HEADER = struct.Struct("<8sIxxxxddQ")
+BIN_HEADER_SIZE = 64
+# Rows per block when the spilled samples are written out
+CHUNK_ROWS = 1 << 16
+
+
+def ring_views(buffer, capacity, columns):
+	header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=buffer)
+	ring = np.ndarray((capacity, columns), dtype=np.float64, buffer=buffer, offset=header.nbytes)
+	return header, ring
+
+
+def read_cpu_times(fd, busy, total):
+	# Per-CPU jiffies from /proc/stat into busy/total, idle and iowait count as not busy. A CPU onlined
+	# after startup has no column and is skipped. Returns the procs_running and procs_blocked counts
+	data = os.pread(fd, 1 << 16, 0)
+	lines = data.split(b"\n")
+	for line in lines[1:]:
+		if not line.startswith(b"cpu"):
+			break
+		fields = line.split()
+		col = cpu_column.get(int(fields[0][3:]))
+		if col is None:
+			continue
+		values = [int(v) for v in fields[1:9]]
+		total[col] = sum(values)
+		busy[col] = total[col] - values[3] - values[4]
+
+	running = blocked = np.nan
+	for line in lines:
+		if line.startswith(b"procs_running"):
+			running = int(line.split()[1])
+		elif line.startswith(b"procs_blocked"):
+			blocked = int(line.split()[1])
+	return running, blocked
+
+
+def read_schedstat(fd, counters):
+	# /proc/schedstat "cpuN" lines: fields 7-9 are ns running, ns runnable but waiting and timeslices
+	data = os.pread(fd, 1 << 20, 0)
+	for line in data.split(b"\n"):
+		if line.startswith(b"cpu"):
+			fields = line.split()
+			col = cpu_column.get(int(fields[0][3:]))
+			if col is not None:
+				counters[0, col], counters[1, col], counters[2, col] = int(fields[7]), int(fields[8]), int(fields[9])
+
+
+def read_pressure(fd):
+	# /proc/pressure/cpu "some"/"full" total= stall time in us, NaN for a line or field the kernel leaves out
+	totals = [np.nan, np.nan]
+	for line in os.pread(fd, 4096, 0).split(b"\n"):
+		kind, _, fields = line.partition(b" ")
+		k = PSI_LINES.get(kind)
+		if k is None:
+			continue
+		for field in fields.split():
+			if field.startswith(b"total=") and field[6:].isdigit():
+				totals[k] = int(field[6:])
+	return totals
+
+
+def open_optional(path):
+	# schedstat and PSI are missing on some kernels and in containers, their columns are then NaN
+	try:
+		return os.open(path, os.O_RDONLY)
+	except OSError:
+		return None
+
+
+def sampler(shm_name, capacity, interval, cpus):
+	"""
+	Runs in its own process: every `interval` reads /proc/stat, /proc/schedstat and
+	/proc/pressure/cpu and writes a row to the shared ring: timestamp, utilization % of each CPU,
+	procs_running and procs_blocked, % of the interval some/all tasks stalled on CPU (PSI), and
+	per CPU the % of the interval it ran tasks, the mean number of tasks waiting on its runqueue
+	and the timeslices per second. The header counts the rows
+	written, the time spent reading and parsing, the samples taken after their deadline and
+	the sampler's CPU time. /proc/stat counts in USER_HZ ticks (usually 10 ms), so at intervals
+	near a tick each CPU's value is quantized to a few levels.
+	"""
+	if cpus:
+		os.sched_setaffinity(0, cpus)
+	# Forked from the generator at nice -15, the sampler should never preempt it
+	os.setpriority(os.PRIO_PROCESS, 0, 0)
+
+	shm = shared_memory.SharedMemory(name=shm_name)
+	header, ring = ring_views(shm.buf, capacity, row_columns)
+	fd = os.open("/proc/stat", os.O_RDONLY)
+	schedstat_fd = open_optional("/proc/schedstat")
+	pressure_fd = open_optional("/proc/pressure/cpu")
+	busy, total = np.zeros(cpu_count), np.zeros(cpu_count)
+	prev_busy, prev_total = np.zeros(cpu_count), np.zeros(cpu_count)
+	util = np.zeros(cpu_count)
+	sched, prev_sched = np.zeros((3, cpu_count)), np.zeros((3, cpu_count))
+	pressure = prev_pressure = None
+	read_cpu_times(fd, prev_busy, prev_total)
+	if schedstat_fd is not None:
+		read_schedstat(schedstat_fd, prev_sched)
+	if pressure_fd is not None:
+		prev_pressure = read_pressure(pressure_fd)
+
+	monotonic, perf_counter_ns = time.monotonic, time.perf_counter_ns
+	deadline = monotonic()
+	prev_sample = deadline
+	n = cpu_count
+	while not header[STOP]:
+		deadline += interval
+		remaining = deadline - monotonic()
+		if remaining > 0:
+			time.sleep(remaining)
+		elif remaining < -interval:
+			header[LATE] += 1
+			# Skip the missed deadlines instead of sampling back to back
+			deadline = monotonic()
+
+		start = perf_counter_ns()
+		now = monotonic()
+		dt = now - prev_sample
+		prev_sample = now
+		running, blocked = read_cpu_times(fd, busy, total)
+		row = ring[header[WRITTEN] % capacity]
+		row[0] = time.time()
+		# A CPU without a tick since the last sample keeps its previous value
+		elapsed = total - prev_total
+		np.divide((busy - prev_busy) * 100, elapsed, out=util, where=elapsed > 0)
+		row[1:n + 1] = util
+		busy, prev_busy = prev_busy, busy
+		total, prev_total = prev_total, total
+
+		row[n + 1], row[n + 2] = running, blocked
+		if pressure_fd is not None:
+			pressure = read_pressure(pressure_fd)
+			row[n + 3] = (pressure[0] - prev_pressure[0]) / 1e4 / dt
+			row[n + 4] = (pressure[1] - prev_pressure[1]) / 1e4 / dt
+			prev_pressure = pressure
+		else:
+			row[n + 3:n + 5] = np.nan
+		if schedstat_fd is not None:
+			read_schedstat(schedstat_fd, sched)
+			delta = sched - prev_sched
+			row[n + 5:2 * n + 5] = delta[0] / 1e7 / dt
+			row[2 * n + 5:3 * n + 5] = delta[1] / 1e9 / dt
+			row[3 * n + 5:] = delta[2] / dt
+			sched, prev_sched = prev_sched, sched
+		else:
+			row[n + 5:] = np.nan
+		header[WRITTEN] += 1
+		header[SAMPLE_NS] += perf_counter_ns() - start
+
+	header[SAMPLER_CPU_NS] = time.process_time_ns()
+	for f in (fd, schedstat_fd, pressure_fd):
+		if f is not None:
+			os.close(f)
+	del header, ring
+	shm.close()
 
-	output_cpu_utilization(outputfile, cpu_data)
 
+class RingDrain:
+	"""
+	Runs in the parent: every `period` copies the rows the sampler wrote since the last pass from
+	the shared ring to an unlinked spill file, so the ring only has to hold a few periods of
+	samples and a run of any length keeps all of them. Rows the sampler overwrote before a pass
+	reached them are counted in `lost`.
+	"""
 
-def monitor_cpu_usage(interval):
-	global monitor_running, cpu_data, cores_to_monitor
-	monitor_running = True
+	def __init__(self, header, ring, period):
+		self.header = header
+		self.ring = ring
+		self.capacity, self.columns = ring.shape
+		self.period = period
+		self.spill = tempfile.TemporaryFile()
+		self.drained = 0
+		self.lost = 0
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target=self._loop, daemon=True)
 
-	while monitor_running:
-		timestamp = time.time()
-		per_cpu = psutil.cpu_percent(interval=interval, percpu=True)
-		cpu_data.append((timestamp, per_cpu))
+	def start(self):
+		self.thread.start()
 
+	def _loop(self):
+		while not self.stopped.wait(self.period):
+			self.drain()
 
-def output_cpu_utilization(outputfile, cpu_data):
-	#Duration of the execution was short enough that no data was collected
-	if not cpu_data:
-		print("No CPU data collected.")
+	def drain(self):
+		written = int(self.header[WRITTEN])
+		first = max(self.drained, written - self.capacity)
+		rows = self.ring[np.arange(first, written) % self.capacity]
+		# Rows the sampler overwrote while they were copied
+		overwritten = min(max(int(self.header[WRITTEN]) - self.capacity - first, 0), len(rows))
+		self.lost += first - self.drained + overwritten
+		self.spill.write(rows[overwritten:].tobytes())
+		self.drained = written
+
+	def stop(self):
+		# Once the sampler has exited: last pass, then the views go before the segment is closed
+		self.stopped.set()
+		self.thread.join()
+		self.drain()
+		self.header = self.ring = None
+		self.spill.seek(0)
+
+	def chunks(self):
+		# The spilled rows in blocks of CHUNK_ROWS, oldest first
+		while True:
+			data = self.spill.read(CHUNK_ROWS * self.columns * 8)
+			if not data:
+				break
+			yield np.frombuffer(data, dtype=np.float64).reshape(-1, self.columns)
+		self.spill.close()
+
+
+def start_cpu_monitoring(interval=0.2, cpus=None, capacity=1 << 12):
+	"""
+	Starts the sampler process and the thread that drains its ring. The ring holds `capacity`
+	samples (~41 s at 10 ms) and is drained every quarter of that, cpus: CPUs the sampler may run
+	on (default: those of the caller).
+	"""
+	global monitor_process, monitor_shm, monitor_drain, monitor_interval
+	monitor_shm = shared_memory.SharedMemory(create=True, size=8 * (HEADER_SLOTS + capacity * row_columns))
+	header, ring = ring_views(monitor_shm.buf, capacity, row_columns)
+	header[:] = 0
+	monitor_interval = interval
+
+	# fork: the sampler needs nothing from the generator's modules and starts at once
+	monitor_process = multiprocessing.get_context("fork").Process(
+		target=sampler, args=(monitor_shm.name, capacity, interval, cpus), daemon=True)
+	monitor_process.start()
+	monitor_drain = RingDrain(header, ring, capacity * interval / 4)
+	monitor_drain.start()
+
+
+def stop_cpu_monitoring(outputfile, start_time, end_time, log_format="csv"):
+	global monitor_process, monitor_shm, monitor_drain
+	if not monitor_process:
 		return
 
-	df = pd.DataFrame(
-		[(ts, *vals) for ts, vals in cpu_data],
-		columns=["timestamp"] +
-		[f"cpu_{i}" for i in range(len(cpu_data[0][1]))]
-	)
+	capacity = (monitor_shm.size // 8 - HEADER_SLOTS) // row_columns
+	header, _ = ring_views(monitor_shm.buf, capacity, row_columns)
+	header[STOP] = 1
+	monitor_process.join(timeout=2.0)
+	monitor_drain.stop()
+
+	written = int(header[WRITTEN])
+	if monitor_drain.lost:
+		print(f"{Fore.YELLOW}CPU sampler ring overran, {monitor_drain.lost} samples are lost{Style.RESET_ALL}")
+	if written:
+		print(f"{Fore.CYAN}CPU sampler: {written} samples every {monitor_interval * 1e3:g} ms, "
+			  f"{header[SAMPLE_NS] / written / 1e3:.1f} us per sample, {header[LATE]} late, "
+			  f"{header[SAMPLER_CPU_NS] / 1e6:.1f} ms of CPU time in total{Style.RESET_ALL}")
+
+	del header
+	monitor_shm.close()
+	monitor_shm.unlink()
+
+	# Only the time range of the run, written out block by block
+	writer = CpuLogWriter(outputfile, log_format, monitor_interval)
+	for samples in monitor_drain.chunks():
+		writer.write(samples[(samples[:, 0] >= start_time) & (samples[:, 0] <= end_time)])
+	writer.close()
+	monitor_process = monitor_shm = monitor_drain = None
+
+
+class CpuLogWriter:
+	"""
+	Appends blocks of sampler rows to the utilization log, _cpu_util.csv or _cpu_util.bin, and to
+	_cpu_sched.csv (same timestamps: run/wait/slices per CPU plus the system-wide counts and PSI).
+	The .bin header is rewritten with the row count on close.
+	"""
+
+	def __init__(self, outputfile, log_format, interval):
+		self.outputfile = outputfile
+		self.log_format = log_format
+		self.interval = interval
+		self.rows = 0
+		self.start = None
+		self.util_file = self.sched_file = None
+
+	def write(self, samples):
+		if not len(samples):
+			return
+		util = samples[:, :cpu_count + 1]
+		sched = np.concatenate((samples[:, :1], samples[:, cpu_count + 1:]), axis=1)
+
+		first = self.rows == 0
+		if first:
+			self.start = samples[0, 0]
+			if self.log_format == "bin":
+				self.util_file = open(f"{self.outputfile}_cpu_util.bin", "wb")
+				self.util_file.write(bin_header(self.interval, self.start, 0))
+			else:
+				self.util_file = open(f"{self.outputfile}_cpu_util.csv", "w")
+			self.sched_file = open(f"{self.outputfile}_cpu_sched.csv", "w")
+
+		if self.log_format == "bin":
+			matrix = util.astype(np.float32)
+			# Relative times fit float32, absolute epoch seconds would lose the milliseconds
+			matrix[:, 0] = util[:, 0] - self.start
+			self.util_file.write(matrix.tobytes())
+		else:
+			df = pd.DataFrame(util, columns=["timestamp"] + [f"cpu_{cpu}" for cpu in cpu_ids])
+			df.to_csv(self.util_file, index=False, header=first)
+
+		columns = ["timestamp"] + SCHED_COLUMNS + [f"{name}_{cpu}" for name in SCHED_CPU_COLUMNS for cpu in cpu_ids]
+		pd.DataFrame(sched, columns=columns).to_csv(self.sched_file, index=False, header=first)
+		self.rows += len(samples)
+
+	def close(self):
+		#Duration of the execution was short enough that no data was collected
+		if not self.rows:
+			print("No CPU data collected.")
+			return
+
+		if self.log_format == "bin":
+			self.util_file.seek(0)
+			self.util_file.write(bin_header(self.interval, self.start, self.rows))
+		self.util_file.close()
+		self.sched_file.close()
+
+
+def bin_header(interval, start, rows):
+	header = BIN_HEADER.pack(BIN_MAGIC, cpu_count, interval, start, rows).ljust(BIN_HEADER_SIZE, b"\0")
+	return header + np.array(cpu_ids, dtype=np.uint32).tobytes()
+
+
+def read_cpu_util_bin(path):
+	"""
+	Returns (header dict, matrix) with the matrix memory mapped read-only: column 0 is seconds since
+	header['start_time'], column 1 + i the utilization % of CPU header['cpu_ids'][i].
+	"""
+	with open(path, "rb") as f:
+		magic, cpus, interval, start, rows = BIN_HEADER.unpack(f.read(BIN_HEADER.size))
+		if magic == BIN_MAGIC:
+			f.seek(BIN_HEADER_SIZE)
+			ids = np.frombuffer(f.read(4 * cpus), dtype=np.uint32).tolist()
+			offset = BIN_HEADER_SIZE + 4 * cpus
+		elif magic == BIN_MAGIC_V1:
+			ids, offset = list(range(cpus)), BIN_HEADER_SIZE
+		else:
+			raise ValueError(f"{path} is not a CPU utilization log")
 
-	df.to_csv(f"{outputfile}_cpu_util.csv", index=False, mode='a')
+	matrix = np.memmap(path, dtype=np.float32, mode="r", offset=offset, shape=(rows, cpus + 1))
+	return {"cpu_count": cpus, "cpu_ids": ids, "interval": interval, "start_time": start, "rows": rows}, matrix
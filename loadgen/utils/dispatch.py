@@ -0,0 +1,96 @@
+import time
+
+DISPATCHERS = ("hybrid", "deadline")
+
+
+def wait_for_start(start_at=None):
+	"""
+	Start barrier shared by generator processes: block until the CLOCK_MONOTONIC instant start_at
+	(None: start right away). Returns (wall, monotonic) times of the start, every generator then
+	measures its deadlines from the same monotonic instant.
+	"""
+	monotonic = time.monotonic
+	if start_at is None:
+		return time.time(), monotonic()
+
+	remaining = start_at - monotonic()
+	if remaining > 0.002:
+		time.sleep(remaining - 0.001)
+	while monotonic() < start_at:
+		pass
+	return time.time() - (monotonic() - start_at), start_at
+
+
+def hybrid_dispatch(workload, release, start_at=None):
+	"""
+	Accumulate IATs on the wall clock, sleep until 1 ms before each deadline and busy-wait the rest.
+	workload: iterable of (iat, arg, index), release(arg, index, request_time, extra) hands a task over.
+	Returns the wall-clock start of the dispatch.
+	"""
+	get_time = time.time
+	sleep = time.sleep
+
+	start_simulation, _ = wait_for_start(start_at)
+	next_request_time = start_simulation
+
+	for IAT, arg, index in workload:
+		next_request_time += IAT
+
+		now = get_time()
+
+		if now < next_request_time:
+			diff = next_request_time - now
+
+			# Sleep in a hybrid manner to reduce CPU usage while maintaining timing accuracy
+			if diff > 0.002:
+				sleep(diff - 0.001)
+
+			# If still time left, busy-wait
+			while get_time() < next_request_time:
+				pass
+
+		release(arg, index, next_request_time, {'lateness': get_time() - next_request_time})
+
+	return start_simulation
+
+
+def deadline_dispatch(workload, release, spin_window=0.0002, start_at=None):
+	"""
+	Fire at absolute CLOCK_MONOTONIC deadlines (start + sum of IATs), so neither wall-clock steps
+	nor the time spent releasing a task shift the following arrivals. The dispatcher sleeps until
+	spin_window before the deadline and only spins for that last window. Arrivals with IAT 0 share
+	the deadline of the one before them and are released in the same wakeup.
+	request_time stays on the wall clock (start + offset of the deadline) like the hybrid dispatcher.
+	"""
+	monotonic = time.monotonic
+	sleep = time.sleep
+
+	start_simulation, start = wait_for_start(start_at)
+	deadline = start
+
+	arrivals = iter(workload)
+	pending = next(arrivals, None)
+
+	while pending is not None:
+		IAT, arg, index = pending
+		deadline += IAT
+
+		batch = [(arg, index)]
+		pending = next(arrivals, None)
+		while pending is not None and pending[0] == 0:
+			batch.append((pending[1], pending[2]))
+			pending = next(arrivals, None)
+
+		remaining = deadline - monotonic()
+		if remaining > spin_window:
+			# Since Python 3.11 time.sleep is clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME)
+			# on the deadline derived from this relative value
+			sleep(remaining - spin_window)
+		while monotonic() < deadline:
+			pass
+
+		request_time = start_simulation + (deadline - start)
+		for arg, index in batch:
+			release(arg, index, request_time, {'lateness': monotonic() - deadline})
+
+	return start_simulation
@@ -1,14 +1,23 @@
 import psutil
 import os
+import csv
+import heapq
 import subprocess
 import __main__
 import pandas as pd
 from colorama import Fore, Style
+from utils.spawn import spawn_cost_summary, RUSAGE_COLUMNS
+from utils.task_schedstat import SCHEDSTAT_COLUMNS
+from utils.calibration import load_table
 
 script_dir = os.path.dirname(os.path.realpath(__main__.__file__))
 log_dir = os.path.join(script_dir, "log")
 os.makedirs(log_dir, exist_ok=True)
 
+# According to calibration, function duration (ms) and the corresponding fib N's (this host's calibrate.py profile)
+fib, dur_list = load_table()
+arg_to_duration = dict(zip(fib, dur_list))
+
 
 def add_to_cgroup():
 	cgroup_procs_path = "/sys/fs/cgroup/loadgen/orchestrator/cgroup.procs"
@@ -50,24 +59,63 @@ def debug_iat(time_fired, iat_values, start_simulation, outputfile):
 				f.write(
 					f"{interarrival_times[i][1]}: {(interarrival_times[i][0] - iat_values[i])/iat_values[i]}%\n")
 
+def read_workload(workload_file):
+	# Lazily yields (iat, arg, index), only the file's read buffer is held in memory
+	with open(workload_file, "r") as f:
+		for i, line in enumerate(f):
+			iat, arg = line.strip().split(" ")
+			yield (float(iat), str(arg), i)
+
+def timing_row(task_result):
+	output, arg, request_time, return_time, extra = task_result
+	row = {
+		'pid': output.split()[0],
+		'arg': arg,
+		'request_time': request_time,
+		'return_time': return_time,
+		'duration': return_time - request_time
+	}
+	# Per-task measurements collected along the way (spawn cost, lateness, ...)
+	row.update(extra)
+	return row
+
+def timing_columns(backend="threaded", spawn_mode="chain", load_mode="open", max_in_flight=0, warm_pool=False,
+				   classes=False, checkpoint=False, task_schedstat=False):
+	# Columns of the _timings rows a run with these features produces, in the order the tasks fill them
+	columns = ['pid', 'arg', 'request_time', 'return_time', 'duration']
+	# The closed loop has no intended fire times
+	if load_mode == "open":
+		columns.append('lateness')
+	if classes:
+		columns.append('class')
+	if max_in_flight:
+		columns.append('cap_wait')
+	if warm_pool:
+		columns.append('warm')
+	if backend == "threaded":
+		# Warm releases skip the launcher queue
+		columns.append('queue_wait')
+	columns.append('spawn_cost')
+	if task_schedstat:
+		columns.extend(SCHEDSTAT_COLUMNS)
+	# The asyncio chain mode leaves reaping to the event loop's watcher, without rusage
+	if backend == "threaded" or spawn_mode == "direct":
+		columns.extend(RUSAGE_COLUMNS)
+	if checkpoint:
+		columns.append('segment')
+	return columns
+
 def log_tasks_output(task_results, outputfile):
 	# Extract PID and argument from each output line
 	lines = []
 	timing_data = []
 
-	for (output, arg, request_time, return_time) in task_results:
-		pid = output.split()[0]
-		lines.append(f"{pid} {arg}")
+	for task_result in task_results:
+		row = timing_row(task_result)
+		lines.append(f"{row['pid']} {row['arg']}")
 
 		# For timings output
-		duration = return_time - request_time
-		timing_data.append({
-			'pid': pid,
-			'arg': arg,
-			'request_time': request_time,
-			'return_time': return_time,
-			'duration': duration
-		})
+		timing_data.append(row)
 
 	# Write to file pids with arguments
 	with open(f"{outputfile}_pids.txt", "w") as f:
@@ -78,6 +126,62 @@ def log_tasks_output(task_results, outputfile):
 	timing_df = pd.DataFrame(timing_data)
 	timing_df.to_csv(f"{outputfile}_timings.csv" ,index=False)
 
+class ResultStream:
+	# Writes every result to _pids.txt and _timings.csv as it completes, header from timing_columns
+
+	def __init__(self, outputfile, columns, timings=True):
+		self.outputfile = outputfile
+		self.count = 0
+		self.pids_file = open(f"{outputfile}_pids.txt", "w")
+		self.timings_file = open(f"{outputfile}_timings.csv", "w", newline="") if timings else None
+		self.writer = None
+		if self.timings_file is not None:
+			self.writer = csv.DictWriter(self.timings_file, fieldnames=columns, restval="")
+			self.writer.writeheader()
+
+	def __setitem__(self, index, task_result):
+		row = timing_row(task_result)
+		self.pids_file.write(f"{row['pid']} {row['arg']}\n")
+		self.count += 1
+
+		if self.writer is not None:
+			self.writer.writerow(row)
+
+	def close(self):
+		self.pids_file.close()
+		if self.timings_file is not None:
+			self.timings_file.close()
+		print(f"{Fore.CYAN}Run {self.count} tasks. Pids saved in {self.outputfile}_pids.txt{Style.RESET_ALL}")
+
+def arg_duration_ms(arg, payload="fib"):
+	# Expected run time of a task, burn payload arguments already are milliseconds
+	if payload == "burn":
+		return float(arg)
+	return arg_to_duration.get(int(arg), dur_list[-1])
+
+def estimate_peak_concurrency(workload, payload="fib"):
+	# workload: iterable of (iat, arg, ...) in arrival order, durations from the calibration table.
+	# Only the end times of tasks still running are kept, so this works on streamed workloads too.
+	running = []
+	now = 0.0
+	peak = 0
+	for iat, arg, *_ in workload:
+		now += iat
+		while running and running[0] <= now:
+			heapq.heappop(running)
+		heapq.heappush(running, now + arg_duration_ms(arg, payload) / 1000)
+		peak = max(peak, len(running))
+	return peak
+
+def log_warm_pool(stats, outputfile):
+	print(f"{Fore.CYAN}Warm pool: {stats['hits']} warm starts, {stats['misses']} cold fallbacks, "
+		  f"{stats['refills']} refills (mean {stats['mean_refill_time']*1e6:.1f} us), "
+		  f"low water {stats['low_water']}/{stats['pool_size']}{Style.RESET_ALL}")
+
+	with open(f"{outputfile}_warm_pool.txt", "w") as f:
+		for key, value in stats.items():
+			f.write(f"{key}: {value}\n")
+
 def log_total_time(outputfile, total_time):
 	with open(f"{os.getcwd()}/gen_stats.txt", "a") as f:
 		f.write(f"{outputfile}: {total_time:.2f} s\n")
@@ -86,11 +190,20 @@ def debug_output_pids(task_results, outputfile):
 	# Extract PID and argument from each output line
 	lines = []
 
-	for (output, arg, _, _) in task_results:
+	for (output, arg, _, _, _) in task_results:
 		pid = output.split()[0]
 		lines.append(f"{pid} {arg}")
 
 	# Write to file pids with arguments
 	with open(f"{outputfile}_pids.txt", "w") as f:
 		f.write("\n".join(lines) + "\n")
-	print(f"{Fore.CYAN}Run {len(lines)} tasks. Pids saved in {outputfile}_pids.txt{Style.RESET_ALL}")
\ No newline at end of file
+	print(f"{Fore.CYAN}Run {len(lines)} tasks. Pids saved in {outputfile}_pids.txt{Style.RESET_ALL}")
+
+def print_spawn_cost(task_results, spawn_mode):
+	summary = spawn_cost_summary([extra['spawn_cost'] for (_, _, _, _, extra) in task_results])
+	if summary is None:
+		return
+
+	print(f"{Fore.CYAN}Spawn cost ({spawn_mode}): mean {summary['mean']*1e6:.1f} us, "
+		  f"p50 {summary['p50']*1e6:.1f} us, p99 {summary['p99']*1e6:.1f} us, "
+		  f"max {summary['max']*1e6:.1f} us over {summary['count']} tasks{Style.RESET_ALL}")
@@ -0,0 +1,108 @@
+import math
+import threading
+import time
+import pandas as pd
+from colorama import Fore, Style
+
+
+class LauncherPool:
+	"""
+	Elastic set of launcher threads draining task_queue. Every `interval` a controller sizes the
+	pool from the spawn work arriving and the backlog: by Little's law launch rate x mean spawn
+	latency launchers are busy, plus one per queued task, with 50% headroom.
+	It grows at once and shrinks by retiring idle launchers, within [min_launchers, max_launchers].
+	The threads inherit the generator's CPU affinity, so they never run on the workload CPUs.
+	worker(pool) runs the launcher loop, calling observe() per spawn and should_retire() when idle.
+	"""
+
+	def __init__(self, task_queue, worker, min_launchers=1, initial=4, max_launchers=16, interval=0.05):
+		self.task_queue = task_queue
+		self.worker = worker
+		self.min = min_launchers
+		self.max = max(max_launchers, min_launchers)
+		self.initial = min(max(initial, self.min), self.max)
+		self.interval = interval
+
+		self.lock = threading.Lock()
+		self.threads = []
+		self.active = 0
+		self.target = self.initial
+		self.launched = 0
+		self.spawn_latency = 0.0
+
+		self.running = False
+		self.controller = None
+		self.timeline = []
+
+	def start(self):
+		self.running = True
+		self._grow(self.initial)
+		self.controller = threading.Thread(target=self._control_loop, daemon=True)
+		self.controller.start()
+
+	def _grow(self, count):
+		for _ in range(count):
+			t = threading.Thread(target=self.worker, args=(self,))
+			with self.lock:
+				self.active += 1
+				self.threads.append(t)
+			t.start()
+
+	def observe(self, spawn_cost):
+		# Exponentially weighted mean of the spawn call, updated by the launchers
+		self.spawn_latency += 0.1 * (spawn_cost - self.spawn_latency)
+		self.launched += 1
+
+	def should_retire(self):
+		with self.lock:
+			if self.running and self.active > self.target and self.active > self.min:
+				self.active -= 1
+				return True
+		return False
+
+	def _control_loop(self):
+		start = time.time()
+		last_launched = 0
+
+		while self.running:
+			time.sleep(self.interval)
+
+			depth = self.task_queue.qsize()
+			launched = self.launched
+			rate = (launched - last_launched) / self.interval
+			last_launched = launched
+
+			busy = rate * self.spawn_latency
+			target = min(self.max, max(self.min, math.ceil(busy * 1.5) + depth))
+			self.target = target
+
+			with self.lock:
+				missing = target - self.active
+			if missing > 0 and self.running:
+				self._grow(missing)
+
+			self.timeline.append((time.time() - start, self.active, depth, rate, self.spawn_latency))
+
+	def stop(self):
+		self.running = False
+		if self.controller:
+			self.controller.join()
+
+		with self.lock:
+			threads = list(self.threads)
+			active = self.active
+		for _ in range(active):
+			self.task_queue.put(None)
+		for t in threads:
+			t.join()
+
+	def log(self, outputfile):
+		if not self.timeline:
+			return
+
+		df = pd.DataFrame(self.timeline, columns=["time", "launchers", "queue_depth", "launch_rate", "spawn_latency"])
+		df.to_csv(f"{outputfile}_launchers.csv", index=False)
+		print(f"{Fore.CYAN}Launchers: {df['launchers'].min()}-{df['launchers'].max()} active "
+			  f"(mean {df['launchers'].mean():.1f}), max queue depth {df['queue_depth'].max()}. "
+			  f"Saved in {outputfile}_launchers.csv{Style.RESET_ALL}")
+
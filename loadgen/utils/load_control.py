@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import deque
+from utils.dispatch import wait_for_start
+
+LOAD_MODES = ("open", "closed")
+
+
+class InFlightLimit:
+	"""
+	Caps the number of tasks between release and reap. Arrivals beyond the cap wait in a FIFO at
+	the generator and are released by the reaper as earlier tasks finish, so the dispatcher keeps
+	firing at trace time and the backlog is never handed to the kernel as a fork storm.
+	release(arg, index, request_time, extra) launches a task, extra['cap_wait'] is the time it
+	spent queued at the generator.
+	"""
+
+	def __init__(self, limit, release):
+		self.limit = limit
+		self.release = release
+		self.in_flight = 0
+		self.pending = deque()
+		# Completion times of slots not taken yet, only read by the closed loop
+		self.freed = deque(maxlen=limit)
+		self.cond = threading.Condition()
+
+		self.queued = 0
+		self.max_pending = 0
+
+	def admit(self, arg, index, request_time, extra):
+		with self.cond:
+			if self.in_flight >= self.limit:
+				self.pending.append((arg, index, request_time, extra, time.time()))
+				self.queued += 1
+				self.max_pending = max(self.max_pending, len(self.pending))
+				return
+			self.in_flight += 1
+
+		extra['cap_wait'] = 0.0
+		self.release(arg, index, request_time, extra)
+
+	def acquire(self):
+		# Closed loop: block until a slot is free, returns how long it sat free since its task finished
+		with self.cond:
+			while self.in_flight >= self.limit:
+				self.cond.wait()
+			self.in_flight += 1
+			freed_at = self.freed.popleft() if self.freed else None
+
+		return 0.0 if freed_at is None else time.time() - freed_at
+
+	def done(self):
+		# Called by the reaper for every reaped task, hands the slot to the oldest queued arrival
+		with self.cond:
+			if not self.pending:
+				self.in_flight -= 1
+				self.freed.append(time.time())
+				self.cond.notify()
+				return
+			arg, index, request_time, extra, queued_at = self.pending.popleft()
+
+		extra['cap_wait'] = time.time() - queued_at
+		self.release(arg, index, request_time, extra)
+
+	def stats(self):
+		return {
+			"limit": self.limit,
+			"queued": self.queued,
+			"max_pending": self.max_pending,
+		}
+
+
+def closed_loop_dispatch(workload, release, limiter, start_at=None):
+	"""
+	limiter.limit virtual users, each issuing the next invocation of the trace as soon as its
+	previous one completes. IATs are ignored, request_time is the time the invocation is issued.
+	Returns the wall-clock start of the dispatch.
+	"""
+	get_time = time.time
+
+	start_simulation, _ = wait_for_start(start_at)
+
+	for _, arg, index in workload:
+		cap_wait = limiter.acquire()
+		release(arg, index, get_time(), {'cap_wait': cap_wait})
+
+	return start_simulation
@@ -0,0 +1,146 @@
+import json
+import os
+import socketserver
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from colorama import Fore, Style
+
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+class LiveMetrics:
+	"""
+	Counters published while a run is in progress. Every counter has a single writer: dispatched
+	is only bumped by the dispatching thread, completed and the latency ring only by the reaper
+	(or the event loop), so the hot paths take no lock. Readers (the exporter) see a value at most
+	one update old. Gauges are callables sampled at read time, e.g. len(active_tasks).
+	Completion latency (return_time - request_time) is kept for the last `window` tasks.
+	"""
+
+	def __init__(self, telemetry=None, window=4096):
+		self.telemetry = telemetry
+		self.started = time.time()
+		self.dispatched = 0
+		self.completed = 0
+		self.window = window
+		self.latencies = array('d', bytes(8 * window))
+		self.gauges = {}
+
+	def dispatch(self):
+		self.dispatched += 1
+
+	def complete(self, request_time, return_time):
+		self.latencies[self.completed % self.window] = return_time - request_time
+		self.completed += 1
+
+	def snapshot(self):
+		completed = self.completed
+		latencies = sorted(self.latencies[:min(completed, self.window)])
+
+		snap = {
+			"uptime": time.time() - self.started,
+			"dispatched": self.dispatched,
+			"completed": completed,
+			"completion_latency": {f"p{p}": latencies[min(len(latencies) - 1, len(latencies) * p // 100)]
+								   for p in LATENCY_PERCENTILES} if latencies else {},
+		}
+		for name, gauge in self.gauges.items():
+			snap[name] = gauge()
+
+		if self.telemetry is not None and self.telemetry.histogram.total:
+			h = self.telemetry.histogram
+			snap["dispatch_lateness"] = {f"p{p:g}": h.percentile(p) / 1e9 for p in (50, 99)}
+			snap["dispatch_lateness"]["max"] = h.max / 1e9
+		return snap
+
+	def prometheus(self):
+		snap = self.snapshot()
+		lines = [
+			"# TYPE loadgen_dispatched_total counter",
+			f"loadgen_dispatched_total {snap['dispatched']}",
+			"# TYPE loadgen_completed_total counter",
+			f"loadgen_completed_total {snap['completed']}",
+		]
+		for name in self.gauges:
+			lines += [f"# TYPE loadgen_{name} gauge", f"loadgen_{name} {snap[name]}"]
+
+		# Summaries without _sum/_count, the quantiles are over the latency window only
+		for name, values in (("completion_latency_seconds", snap["completion_latency"]),
+							 ("dispatch_lateness_seconds", snap.get("dispatch_lateness", {}))):
+			lines.append(f"# TYPE loadgen_{name} summary")
+			for key, value in values.items():
+				if key == "max":
+					lines.append(f"loadgen_{name}_max {value:.9f}")
+				else:
+					lines.append(f'loadgen_{name}{{quantile="{float(key[1:]) / 100:g}"}} {value:.9f}')
+		return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+	"""
+	Serves LiveMetrics from daemon threads: GET /metrics (Prometheus text) and /metrics.json on
+	127.0.0.1:port, and/or one JSON snapshot per connection on a UNIX socket.
+	"""
+
+	def __init__(self, metrics, port=None, socket_path=None):
+		self.metrics = metrics
+		self.servers = []
+		self.socket_path = socket_path
+
+		if port is not None:
+			self.servers.append(ThreadingHTTPServer(("127.0.0.1", port), self._http_handler()))
+		if socket_path is not None:
+			if os.path.exists(socket_path):
+				os.unlink(socket_path)
+			self.servers.append(socketserver.ThreadingUnixStreamServer(socket_path, self._socket_handler()))
+
+	def _http_handler(self):
+		metrics = self.metrics
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path == "/metrics":
+					body, content_type = metrics.prometheus(), "text/plain; version=0.0.4"
+				elif self.path == "/metrics.json":
+					body, content_type = json.dumps(metrics.snapshot()), "application/json"
+				else:
+					self.send_error(404)
+					return
+				body = body.encode()
+				self.send_response(200)
+				self.send_header("Content-Type", content_type)
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+
+		return Handler
+
+	def _socket_handler(self):
+		metrics = self.metrics
+
+		class Handler(socketserver.StreamRequestHandler):
+			def handle(self):
+				self.wfile.write((json.dumps(metrics.snapshot()) + "\n").encode())
+
+		return Handler
+
+	def start(self):
+		for server in self.servers:
+			server.daemon_threads = True
+			threading.Thread(target=server.serve_forever, daemon=True).start()
+			if isinstance(server, ThreadingHTTPServer):
+				print(f"{Fore.GREEN}Metrics on http://127.0.0.1:{server.server_address[1]}/metrics{Style.RESET_ALL}")
+			else:
+				print(f"{Fore.GREEN}Metrics on unix socket {self.socket_path}{Style.RESET_ALL}")
+
+	def stop(self):
+		for server in self.servers:
+			server.shutdown()
+			server.server_close()
+		if self.socket_path is not None and os.path.exists(self.socket_path):
+			os.unlink(self.socket_path)
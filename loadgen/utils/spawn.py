@@ -0,0 +1,300 @@
+import os
+import subprocess
+import threading
+import argparse
+import time
+import statistics
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+payload_path = os.path.join(script_dir, "payload/launch_function.out")
+sched_ext_wrapper = os.path.join(script_dir, "payload/run_with_sched_ext")
+
+SCHED_EXT = 7
+PAYLOAD_NICE = 15
+FIFO_PRIORITY = 50
+
+SPAWN_MODES = ("chain", "direct")
+COMPLETION_MODES = ("pipe", "shared", "none")
+# fib: the argument is a fib N, burn: milliseconds of CPU time in one of the BURN_PROFILES
+PAYLOADS = ("fib", "burn")
+BURN_PROFILES = ("cpu", "mem", "io")
+# Scheduling policies a workload class can run under, other is the default CFS/EEVDF class
+SCHED_POLICIES = ("other", "fifo", "ext", "batch", "idle")
+CHRT_FLAGS = {"fifo": ["-f", str(FIFO_PRIORITY)], "batch": ["-b", "0"], "idle": ["-i", "0"]}
+
+
+WARM_ARG = "--warm"
+# The payload blocks until EOF on its stdin, see direct_spawner
+HOLD_ARG = "--hold"
+
+
+class DirectChild:
+	# Exposes the Popen attributes the launcher, reaper and warm pool use
+	__slots__ = ("pid", "stdout", "stdin")
+
+	def __init__(self, pid, stdout, stdin=None):
+		self.pid = pid
+		self.stdout = stdout
+		self.stdin = stdin
+
+
+class SharedOutput:
+	"""
+	One pipe every payload gets as stdout instead of a pipe per task. A payload's record is a
+	single write shorter than PIPE_BUF, so records never interleave, and a thread drains the
+	read end so payloads never block on a full pipe.
+	"""
+
+	def __init__(self):
+		self.read_fd, self.fd = os.pipe()
+		self.records = 0
+		self.thread = threading.Thread(target=self._drain, daemon=True)
+		self.thread.start()
+
+	def _drain(self):
+		with open(self.read_fd, "rb") as f:
+			for _ in f:
+				self.records += 1
+
+	def close(self):
+		# EOF once the last payload holding the write end has exited
+		os.close(self.fd)
+		self.thread.join()
+
+
+class DiscardOutput:
+	# Payload stdout goes to /dev/null, opened once for all spawns
+	records = None
+
+	def __init__(self):
+		self.fd = os.open(os.devnull, os.O_WRONLY | os.O_CLOEXEC)
+
+	def close(self):
+		os.close(self.fd)
+
+
+def completion_channel(mode):
+	# None keeps the per-task stdout pipe
+	if mode == "pipe":
+		return None
+	if mode == "shared":
+		return SharedOutput()
+	if mode == "none":
+		return DiscardOutput()
+	raise ValueError(f"Unknown completion mode: {mode}")
+
+
+def read_output(proc):
+	# Without a per-task pipe (shared/none completion) the pid is all the logs need
+	if proc.stdout is None:
+		return str(proc.pid)
+	output = proc.stdout.read().strip()
+	proc.stdout.close()
+	return output
+
+
+RUSAGE_COLUMNS = ["utime", "stime", "nvcsw", "nivcsw"]
+
+
+def rusage_fields(rusage):
+	"""
+	Per-task accounting from wait4. The wrappers of the chain mode exec into the payload, so
+	this is the payload plus the wrapper execs before it. ru_maxrss is left out: Linux keeps the
+	high-water mark across exec, so it never drops below the RSS of the orchestrator.
+	"""
+	return {
+		'utime': rusage.ru_utime,
+		'stime': rusage.ru_stime,
+		'nvcsw': rusage.ru_nvcsw,
+		'nivcsw': rusage.ru_nivcsw,
+	}
+
+
+def workload_cpus(cpu_count, housekeeping=(0,)):
+	# Housekeeping CPUs (CPU 0 by default) are kept for the orchestrator, functions run on the rest
+	return set(range(cpu_count)) - set(housekeeping)
+
+
+def payload_options(payload="fib", profile="cpu", mem_mb=None):
+	# Payload flags that go before the argument, mem_mb: buffer of the mem profile (payload default 64 MB)
+	if payload == "burn":
+		if profile == "mem" and mem_mb:
+			return ["--burn", profile, "--mem", str(mem_mb)]
+		return ["--burn", profile]
+	return []
+
+
+def chain_command(cpus, fifo=False, sched_ext=False, payload_args=(), nice=PAYLOAD_NICE, policy=None):
+	# `nice -n 15 taskset -c ... [chrt -f 50] [run_with_sched_ext] launch_function.out [--burn ...]`, without the argument.
+	# policy (one of SCHED_POLICIES) replaces the fifo/sched_ext flags
+	cmd = ["nice", "-n", str(nice), "taskset", "-c", ",".join(str(c) for c in sorted(cpus))]
+	if policy in CHRT_FLAGS:
+		cmd.extend(["chrt", *CHRT_FLAGS[policy]])
+	elif policy == "ext":
+		cmd.append(sched_ext_wrapper)
+	elif policy is None:
+		if fifo:
+			cmd.extend(["chrt", "-f", str(FIFO_PRIORITY)])
+		if sched_ext:
+			cmd.append(sched_ext_wrapper)
+	cmd.append(payload_path)
+	cmd.extend(payload_args)
+	return cmd
+
+
+def attribute_setter(cpus, fifo=False, sched_ext=False, nice=PAYLOAD_NICE, policy=None):
+	"""
+	Returns apply(pid) that gives a spawned payload the workload CPUs, the niceness and the policy
+	the chain wrappers would have. Affinity goes first so the child leaves the orchestrator CPU
+	before it can become FIFO there.
+	"""
+	if policy is None:
+		policy = "fifo" if fifo else "ext" if sched_ext else "other"
+	policy, param = {
+		"other": (None, None),
+		"fifo": (os.SCHED_FIFO, os.sched_param(FIFO_PRIORITY)),
+		"ext": (SCHED_EXT, os.sched_param(0)),
+		"batch": (os.SCHED_BATCH, os.sched_param(0)),
+		"idle": (os.SCHED_IDLE, os.sched_param(0)),
+	}[policy]
+	cpus = frozenset(cpus)
+
+	def apply(pid):
+		os.sched_setaffinity(pid, cpus)
+		# Same niceness `nice -n` gives: relative to the thread that spawned it
+		os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, 0) + nice)
+		if policy is not None:
+			os.sched_setscheduler(pid, policy, param)
+
+	return apply
+
+
+def chain_spawner(cpus, fifo=False, sched_ext=False, warm=False, stdout=None, payload_args=(), nice=PAYLOAD_NICE,
+				  policy=None):
+	"""
+	Launch every function through the nice/taskset/chrt wrappers, each wrapper is a separate
+	execve before the payload starts.
+	With warm=True the payload is started with --warm and reads its argument from stdin.
+	stdout: fd shared by all payloads, None for a pipe per task.
+	"""
+	cmd = chain_command(cpus, fifo, sched_ext, payload_args, nice, policy)
+	stdout = subprocess.PIPE if stdout is None else stdout
+
+	def spawn(arg):
+		# The Popen object has to stay referenced until the task is reaped, otherwise its
+		# finalizer hands it to subprocess' cleanup which waits on it behind our back
+		return subprocess.Popen(
+			cmd + [arg],
+			stdin=subprocess.PIPE if warm else None,
+			stdout=stdout,
+			stderr=subprocess.DEVNULL,
+			text=True
+		)
+
+	return spawn
+
+
+def direct_spawner(cpus, fifo=False, sched_ext=False, warm=False, stdout=None, payload_args=(), nice=PAYLOAD_NICE,
+				   policy=None):
+	"""
+	Exec the payload directly with posix_spawn (vfork + exec, no wrapper binaries). posix_spawn
+	cannot set affinity or nice, so the payload starts with --hold, parked on its stdin: the
+	launcher applies the attributes to the pid, then closes the pipe to release it. The launcher
+	stays on its own CPUs, and SCHED_EXT is entered after the exec, with the payload's cmdline.
+	Only the exec itself runs on the launcher's CPU. A warm payload is already parked on its argument.
+	"""
+	apply = attribute_setter(cpus, fifo, sched_ext, nice, policy)
+	environ = os.environ
+	argv = [payload_path, *payload_args] if warm else [payload_path, *payload_args, HOLD_ARG]
+
+	def spawn(arg):
+		# All ends are O_CLOEXEC, only the dup2'd stdin/stdout survive the exec
+		if stdout is None:
+			r, w = os.pipe()
+		else:
+			r, w = None, stdout
+		stdin_r, stdin_w = os.pipe()
+		try:
+			pid = os.posix_spawn(
+				payload_path, argv + [arg], environ,
+				file_actions=[(os.POSIX_SPAWN_DUP2, w, 1), (os.POSIX_SPAWN_DUP2, stdin_r, 0)],
+				setsigmask=()
+			)
+		finally:
+			if r is not None:
+				os.close(w)
+			os.close(stdin_r)
+
+		try:
+			apply(pid)
+		finally:
+			if not warm:
+				os.close(stdin_w)
+
+		return DirectChild(pid, open(r, "r") if r is not None else None, open(stdin_w, "w") if warm else None)
+
+	return spawn
+
+
+def make_spawner(mode, cpus, fifo=False, sched_ext=False, warm=False, stdout=None, payload_args=(), nice=PAYLOAD_NICE,
+				 policy=None):
+	if mode == "chain":
+		return chain_spawner(cpus, fifo, sched_ext, warm, stdout, payload_args, nice, policy)
+	if mode == "direct":
+		return direct_spawner(cpus, fifo, sched_ext, warm, stdout, payload_args, nice, policy)
+	raise ValueError(f"Unknown spawn mode: {mode}")
+
+
+def spawn_cost_summary(costs):
+	costs = sorted(costs)
+	if not costs:
+		return None
+
+	def pct(p):
+		return costs[min(len(costs) - 1, int(p / 100 * len(costs)))]
+
+	return {
+		"count": len(costs),
+		"mean": statistics.fmean(costs),
+		"p50": pct(50),
+		"p99": pct(99),
+		"max": costs[-1],
+	}
+
+
+def benchmark(iterations, arg):
+	"""
+	Spawn the payload `iterations` times per mode, one at a time, and measure the
+	parent-side spawn call and the full spawn-to-exit round trip. The round trip includes
+	the wrapper execs of the chain mode, which happen in the child after Popen returns.
+	"""
+	cpus = workload_cpus(os.cpu_count()) or {0}
+
+	for mode in SPAWN_MODES:
+		spawn = make_spawner(mode, cpus)
+		call_costs, round_trips = [], []
+
+		for _ in range(iterations):
+			start = time.perf_counter()
+			proc = spawn(arg)
+			spawned = time.perf_counter()
+			os.waitpid(proc.pid, 0)
+			end = time.perf_counter()
+			proc.stdout.close()
+
+			call_costs.append(spawned - start)
+			round_trips.append(end - start)
+
+		for label, costs in (("spawn call", call_costs), ("spawn to exit", round_trips)):
+			s = spawn_cost_summary(costs)
+			print(f"{mode:>6} {label:>13}: mean {s['mean']*1e6:8.1f} us  "
+				  f"p50 {s['p50']*1e6:8.1f} us  p99 {s['p99']*1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compare the per-invocation cost of the spawn modes")
+	parser.add_argument("--iterations", type=int, default=500, help="Spawns per mode")
+	parser.add_argument("--arg", type=str, default="1", help="Payload argument (keep it small)")
+	args = parser.parse_args()
+
+	benchmark(args.iterations, args.arg)
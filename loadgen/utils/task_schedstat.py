@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from colorama import Fore, Style
+
+
+SCHEDSTAT_COLUMNS = ["run_time", "wait_time", "timeslices"]
+
+
+def read_schedstat_fd(fd):
+	# /proc/<pid>/schedstat: ns on CPU, ns runnable but waiting on a runqueue, timeslices
+	run_ns, wait_ns, slices = os.pread(fd, 64, 0).split()
+	return int(run_ns), int(wait_ns), int(slices)
+
+
+def schedstat_fields(values):
+	run_ns, wait_ns, slices = values
+	return {
+		'run_time': run_ns / 1e9,
+		'wait_time': wait_ns / 1e9,
+		'timeslices': slices,
+	}
+
+
+class TaskSchedstat:
+	"""
+	Per-task scheduling delay without tracing. at_exit(pid) is called by the reaper once the
+	pidfd reports the exit and before wait4, while the task is a zombie and its schedstat is
+	still readable. With interval > 0 a sampler thread also reads every live pid in `live()`
+	(a snapshot of the tracked pids) each interval, through fds it keeps open, so a sample
+	is one pread per task; its last values stand in when the exit read fails.
+	The sampler alone owns its fds and closes those of pids no longer live.
+	"""
+
+	def __init__(self, live, interval=0.0):
+		self.live = live
+		self.interval = interval
+		self.last = {}
+		self.fds = {}
+		self.failures = 0
+		self.samples = 0
+		self.sample_time = 0.0
+		self.running = False
+		self.thread = None
+
+	def at_exit(self, pid):
+		try:
+			fd = os.open(f"/proc/{pid}/schedstat", os.O_RDONLY | os.O_CLOEXEC)
+			try:
+				values = read_schedstat_fd(fd)
+			finally:
+				os.close(fd)
+		except (OSError, ValueError):
+			values = self.last.get(pid)
+			if values is None:
+				self.failures += 1
+				return {}
+		self.last.pop(pid, None)
+		return schedstat_fields(values)
+
+	def start(self):
+		if self.interval <= 0:
+			return
+		self.running = True
+		self.thread = threading.Thread(target=self._sample_loop, daemon=True)
+		self.thread.start()
+
+	def _sample_loop(self):
+		perf_counter = time.perf_counter
+		while self.running:
+			time.sleep(self.interval)
+			start = perf_counter()
+			live = set(self.live())
+
+			for pid in [pid for pid in self.fds if pid not in live]:
+				os.close(self.fds.pop(pid))
+				self.last.pop(pid, None)
+
+			for pid in live:
+				try:
+					fd = self.fds.get(pid)
+					if fd is None:
+						fd = self.fds[pid] = os.open(f"/proc/{pid}/schedstat", os.O_RDONLY | os.O_CLOEXEC)
+					self.last[pid] = read_schedstat_fd(fd)
+				except (OSError, ValueError):
+					# Exited between the snapshot and the read, or a reused pid behind a stale fd
+					fd = self.fds.pop(pid, None)
+					if fd is not None:
+						os.close(fd)
+
+			self.samples += 1
+			self.sample_time += perf_counter() - start
+
+	def stop(self):
+		self.running = False
+		if self.thread:
+			self.thread.join()
+		for fd in self.fds.values():
+			os.close(fd)
+		self.fds = {}
+
+		if self.samples:
+			print(f"{Fore.CYAN}Task schedstat sampler: {self.samples} passes, "
+				  f"{self.sample_time / self.samples * 1e3:.2f} ms per pass{Style.RESET_ALL}")
+		if self.failures:
+			print(f"{Fore.YELLOW}No schedstat for {self.failures} tasks (CONFIG_SCHEDSTATS off?){Style.RESET_ALL}")
@@ -0,0 +1,139 @@
+import heapq
+from array import array
+from colorama import Fore, Style
+
+
+class LatenessHistogram:
+	"""
+	HDR-style log-linear histogram of non-negative integers (nanoseconds). Values below
+	2**sub_bits are counted exactly, larger ones fall in one of 2**(sub_bits-1) linear
+	sub-buckets of their power of two, so the relative error stays below 2**-(sub_bits-1).
+	Values past 2**max_bits land in the last bucket. The counts are one preallocated array.
+	"""
+
+	def __init__(self, sub_bits=8, max_bits=40):
+		self.sub_bits = sub_bits
+		self.half = 1 << (sub_bits - 1)
+		self.size = self.half * (max_bits - sub_bits + 2)
+		self.counts = array('Q', bytes(8 * self.size))
+		self.total = 0
+		self.sum = 0
+		self.max = 0
+
+	def index(self, value):
+		shift = value.bit_length() - self.sub_bits
+		if shift <= 0:
+			return value
+		return min(self.half * shift + (value >> shift), self.size - 1)
+
+	def value_at(self, index):
+		# Middle of the bucket's value range
+		if index < 2 * self.half:
+			return index
+		shift = index // self.half - 1
+		return ((index - self.half * shift) << shift) + (1 << (shift - 1))
+
+	def record(self, value):
+		if value < 0:
+			value = 0
+		self.counts[self.index(value)] += 1
+		self.total += 1
+		self.sum += value
+		if value > self.max:
+			self.max = value
+
+	def percentile(self, p):
+		if not self.total:
+			return 0
+		target = max(1, -(-self.total * p // 100))
+		seen = 0
+		for i, count in enumerate(self.counts):
+			seen += count
+			if seen >= target:
+				return min(self.value_at(i), self.max)
+		return self.max
+
+
+class DispatchTelemetry:
+	"""
+	Always-on record of how far each dispatch fired after its intended time. Lateness goes into a
+	LatenessHistogram, runs of consecutive dispatches later than burst_threshold are kept as
+	bursts (only the `worst` ones by peak lateness). With per_task=True the intended and actual
+	fire times are also appended to flat arrays for the _IAT.txt/_IAT_diff.txt files.
+	record() is called from the dispatching thread only.
+	"""
+
+	PERCENTILES = (50, 90, 99, 99.9, 99.99)
+
+	def __init__(self, per_task=False, burst_threshold=0.001, worst=10):
+		self.histogram = LatenessHistogram()
+		self.per_task = per_task
+		self.intended = array('d')
+		self.actual = array('d')
+		self.args = array('q')
+
+		self.burst_threshold = burst_threshold
+		self.worst = worst
+		self.bursts = []
+		self.burst_tasks = 0
+		self.burst_start = 0.0
+		self.burst_end = 0.0
+		self.burst_max = 0.0
+
+	def record(self, arg, intended, lateness):
+		self.histogram.record(int(lateness * 1e9))
+
+		if self.per_task:
+			self.intended.append(intended)
+			self.actual.append(intended + lateness)
+			self.args.append(int(arg))
+
+		if lateness > self.burst_threshold:
+			if not self.burst_tasks:
+				self.burst_start = intended
+				self.burst_max = 0.0
+			self.burst_tasks += 1
+			self.burst_end = intended
+			if lateness > self.burst_max:
+				self.burst_max = lateness
+		elif self.burst_tasks:
+			self._close_burst()
+
+	def _close_burst(self):
+		burst = (self.burst_max, self.burst_start, self.burst_end, self.burst_tasks)
+		if len(self.bursts) < self.worst:
+			heapq.heappush(self.bursts, burst)
+		else:
+			heapq.heappushpop(self.bursts, burst)
+		self.burst_tasks = 0
+
+	def write(self, outputfile, start_simulation):
+		if self.burst_tasks:
+			self._close_burst()
+
+		h = self.histogram
+		if not h.total:
+			return
+
+		lines = [f"Dispatch lateness over {h.total} tasks (us)",
+				 f"mean: {h.sum / h.total / 1e3:.1f}"]
+		lines += [f"p{p:g}: {h.percentile(p) / 1e3:.1f}" for p in self.PERCENTILES]
+		lines.append(f"max: {h.max / 1e3:.1f}")
+
+		lines.append(f"Worst bursts (consecutive dispatches later than {self.burst_threshold * 1e6:.0f} us)")
+		for peak, start, end, tasks in sorted(self.bursts, reverse=True):
+			lines.append(f"+{start - start_simulation:.3f} s: {tasks} tasks over {(end - start) * 1e3:.1f} ms, "
+						 f"max {peak * 1e6:.1f} us")
+
+		with open(f"{outputfile}_dispatch.txt", "w") as f:
+			f.write("\n".join(lines) + "\n")
+
+		print(f"{Fore.CYAN}Dispatch lateness: p50 {h.percentile(50) / 1e3:.1f} us, p99 {h.percentile(99) / 1e3:.1f} us, "
+			  f"max {h.max / 1e3:.1f} us, {len(self.bursts)} bursts. Saved in {outputfile}_dispatch.txt{Style.RESET_ALL}")
+
+	def iat_trace(self, start_simulation):
+		# (time_fired, iat_values) in the shape exec_utils.debug_iat takes
+		time_fired = list(zip(self.actual, self.args))
+		iat_values = [self.intended[0] - start_simulation] + [
+			self.intended[i] - self.intended[i - 1] for i in range(1, len(self.intended))]
+		return time_fired, iat_values
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from collections import deque
+from utils.spawn import WARM_ARG
+
+
+class WarmPool:
+	"""
+	Pre-spawned payload processes parked on a blocking read of their stdin.
+	acquire() hands one out (the caller writes the fib argument to its stdin), a background
+	thread spawns a replacement for every process handed out.
+	"""
+
+	def __init__(self, spawn, size):
+		self.spawn = spawn
+		self.size = size
+		self.parked = deque()
+		self.wanted = threading.Semaphore(0)
+		self.running = False
+		self.refill_thread = None
+
+		self.hits = 0
+		self.misses = 0
+		self.refills = 0
+		self.refill_time = 0.0
+		self.max_refill_time = 0.0
+		self.low_water = size
+
+	def start(self):
+		for _ in range(self.size):
+			self.parked.append(self.spawn(WARM_ARG))
+
+		self.running = True
+		self.refill_thread = threading.Thread(target=self._refill_loop, daemon=True)
+		self.refill_thread.start()
+
+	def acquire(self):
+		# deque.popleft is atomic, the dispatcher never blocks on the refill thread
+		try:
+			proc = self.parked.popleft()
+		except IndexError:
+			self.misses += 1
+			self.low_water = 0
+			return None
+
+		self.hits += 1
+		self.low_water = min(self.low_water, len(self.parked))
+		self.wanted.release()
+		return proc
+
+	def _refill_loop(self):
+		perf_counter = time.perf_counter
+
+		while True:
+			self.wanted.acquire()
+			if not self.running:
+				return
+
+			try:
+				start = perf_counter()
+				self.parked.append(self.spawn(WARM_ARG))
+				elapsed = perf_counter() - start
+			except Exception as e:
+				print(f"Warm Pool Error: {e}")
+				continue
+
+			self.refills += 1
+			self.refill_time += elapsed
+			self.max_refill_time = max(self.max_refill_time, elapsed)
+
+	def close(self):
+		self.running = False
+		self.wanted.release()
+		if self.refill_thread:
+			self.refill_thread.join()
+
+		# Parked payloads exit on EOF without running anything
+		while self.parked:
+			proc = self.parked.popleft()
+			proc.stdin.close()
+			os.waitpid(proc.pid, 0)
+			if proc.stdout is not None:
+				proc.stdout.close()
+
+	def stats(self):
+		return {
+			"pool_size": self.size,
+			"hits": self.hits,
+			"misses": self.misses,
+			"refills": self.refills,
+			"mean_refill_time": self.refill_time / self.refills if self.refills else 0.0,
+			"max_refill_time": self.max_refill_time,
+			"low_water": self.low_water,
+		}